@@ -0,0 +1,117 @@
+"""Compare the context path walk against the previous os.walk + fnmatch scan.
+
+Builds a synthetic tree (100k files by default, including a node_modules
+directory and a .gitignore) and times resolving a ``**`` context path.
+
+    python benchmarks/bench_glob.py [--files 100000] [--json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import fnmatch
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_lib.pathmatch import PathMatcher
+
+
+EXTENSIONS = [
+    "txt", "md", "markdown", "py", "js", "jsx", "ts", "tsx",
+    "html", "css", "scss", "json", "yaml", "yml", "xml", "csv",
+    "sh", "bash", "zsh", "rb", "php", "java", "c", "cpp", "h",
+    "hpp", "cs", "go", "rs", "swift", "kt", "r", "sql", "conf",
+    "cfg", "ini", "env", "properties", "toml"
+]
+
+FILE_TYPES = ["py", "js", "md", "png", "o", "json", "log"]
+
+
+def build_tree(root, file_count, files_per_dir=50):
+    # A third of the files live in directories that should be skipped
+    skipped = [os.path.join("node_modules", "pkg"), ".git", "build"]
+    dir_count = max(1, file_count // files_per_dir)
+    created = 0
+    for d in range(dir_count):
+        if d % 3 == 2:
+            directory = os.path.join(root, skipped[d % len(skipped)], "d{0}".format(d))
+        else:
+            directory = os.path.join(root, "src", "m{0}".format(d % 40), "d{0}".format(d))
+        os.makedirs(directory, exist_ok=True)
+        for f in range(files_per_dir):
+            name = "f{0}.{1}".format(f, FILE_TYPES[f % len(FILE_TYPES)])
+            open(os.path.join(directory, name), 'w').close()
+            created += 1
+    with open(os.path.join(root, ".gitignore"), 'w') as f:
+        f.write("*.log\n/build/\n")
+    return created
+
+
+def legacy_walk(path, supported_extensions):
+    # The implementation before the shared path matcher
+    files = []
+    base_path = path.split('**')[0]
+    for root, _, names in os.walk(base_path):
+        for name in names:
+            if any(name.endswith('.' + ext) for ext in supported_extensions):
+                file_path = os.path.join(root, name)
+                if fnmatch.fnmatch(file_path, path):
+                    files.append(file_path)
+    return files
+
+
+def best_of(runs, func):
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='ollama-bench-')
+    try:
+        created = build_tree(root, args.files)
+        pattern = os.path.join(root, '**.py')
+
+        legacy_time, legacy_files = best_of(args.runs, lambda: legacy_walk(pattern, EXTENSIONS))
+        matcher_time, matcher_files = best_of(
+            args.runs, lambda: PathMatcher(pattern, EXTENSIONS).files())
+        unpruned_time, _ = best_of(
+            args.runs, lambda: PathMatcher(pattern, EXTENSIONS, ignored_dirs=[], use_ignore_files=False).files())
+
+        results = {
+            'benchmark': 'glob',
+            'files_in_tree': created,
+            'legacy': {'seconds': legacy_time, 'matches': len(legacy_files)},
+            'matcher': {'seconds': matcher_time, 'matches': len(matcher_files)},
+            'matcher_without_pruning': {'seconds': unpruned_time},
+            'speedup': legacy_time / matcher_time if matcher_time else None
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("Tree: {0} files".format(created))
+    print("os.walk + fnmatch:         {0:8.3f}s  {1} files".format(legacy_time, len(legacy_files)))
+    print("PathMatcher (no pruning):  {0:8.3f}s".format(unpruned_time))
+    print("PathMatcher:               {0:8.3f}s  {1} files".format(matcher_time, len(matcher_files)))
+    print("Speedup:                   {0:8.1f}x".format(results['speedup']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Type into a view with inline completion on, against a mock Ollama server.
+
+Lines of code are typed a character at a time with a pause after each line.
+Reports how long after the last keystroke a suggestion appears, the time to
+first token recorded in the metrics log, how many requests typing cancelled,
+and how often a suggestion came from the cache after backspacing over a
+character and typing it again.
+
+    python benchmarks/bench_inline.py [--lines 10] [--keystroke-ms 40] [--pause-ms 600] [--json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness
+from mock_ollama import MockOllama
+
+
+LINE = "    total = compute_value(items, index) + offset\n"
+
+
+def wait_for_suggestion(view, timeout):
+    # Returns the seconds until a phantom is shown, or None
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if view.phantoms.get('ollama_inline'):
+            return time.perf_counter() - start
+        time.sleep(0.002)
+    return None
+
+
+def percentile_ms(values, fraction):
+    if not values:
+        return None
+    return values[int(fraction * (len(values) - 1))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=10)
+    parser.add_argument('--keystroke-ms', type=int, default=40)
+    parser.add_argument('--pause-ms', type=int, default=600)
+    parser.add_argument('--debounce-ms', type=int, default=150)
+    parser.add_argument('--first-token-ms', type=int, default=80, help="mock prompt evaluation time")
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    mock = MockOllama(tokens=16, rate=200, first_token_delay=args.first_token_ms / 1000.0).start()
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            loop = harness.install({
+                'ollamaUrl': mock.url,
+                'selected_model': 'mock:latest',
+                'preload_models': False,
+                'prefetch_context': False,
+                'inline_completion': True,
+                'inline_debounce_ms': args.debounce_ms
+            })
+            plugin = harness.load_plugin()
+            time.sleep(0.2)
+            loop.drain()
+            listener = plugin.OllamaInlineCompletionListener()
+            cache = plugin.CompletionCache.get_instance()
+            hits = []
+            cache_get = cache.get
+
+            def counting_get(*key):
+                completion = cache_get(*key)
+                hits.append(completion is not None)
+                return completion
+
+            cache.get = counting_get
+            view = harness.View("def run(items, index, offset):\n")
+
+            def type_text(text):
+                for i, char in enumerate(text):
+                    if i:
+                        time.sleep(args.keystroke_ms / 1000.0)
+                    view.run_command('insert', {'characters': char})
+                    listener.on_modified_async(view)
+                    listener.on_selection_modified_async(view)
+
+            shown = []
+            timeout = args.pause_ms / 1000.0
+            for i in range(args.lines):
+                type_text(LINE[:-1])
+                shown.append(wait_for_suggestion(view, timeout))
+                time.sleep(max(0.0, timeout - (shown[-1] or timeout)))
+                # Backspace and retype the last character: same text as before
+                view.run_command('left_delete')
+                listener.on_modified_async(view)
+                type_text(LINE[-2])
+                wait_for_suggestion(view, timeout)
+                type_text(LINE[-1])
+
+            time.sleep(timeout)
+            loop.drain()
+            sent = sum(1 for path, body in mock.requests if 'suffix' in body)
+            entries = [entry for entry in plugin.configure_metrics_log().entries() if entry.get('kind') == 'inline']
+            plugin.plugin_unloaded()
+    finally:
+        mock.stop()
+
+    latencies = sorted(value for value in shown if value is not None)
+    ttft = sorted(entry['ttft'] for entry in entries if entry.get('ttft') is not None)
+    results = {
+        'benchmark': 'inline',
+        'pauses': len(shown),
+        'suggestions_shown': len(latencies),
+        'suggestion_ms_p50': percentile_ms(latencies, 0.5),
+        'suggestion_ms_p95': percentile_ms(latencies, 0.95),
+        'ttft_ms_p50': percentile_ms(ttft, 0.5),
+        'ttft_ms_p95': percentile_ms(ttft, 0.95),
+        'requests_sent': sent,
+        'requests_completed': len(entries),
+        'requests_cancelled': sent - len(entries),
+        'cache_lookups': len(hits),
+        'cache_hits': sum(hits)
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    def ms(value):
+        return "-" if value is None else "{0:.0f}ms".format(value)
+
+    print("{0} pauses, suggestion shown after {1} of them".format(results['pauses'], results['suggestions_shown']))
+    print("Last keystroke to suggestion: p50 {0}, p95 {1} (debounce {2}ms)".format(
+        ms(results['suggestion_ms_p50']), ms(results['suggestion_ms_p95']), args.debounce_ms))
+    print("Time to first token:          p50 {0}, p95 {1}".format(ms(results['ttft_ms_p50']), ms(results['ttft_ms_p95'])))
+    print("Requests: {0} sent, {1} completed, {2} cancelled by typing".format(
+        sent, results['requests_completed'], results['requests_cancelled']))
+    print("Cache: {0} hits in {1} lookups".format(results['cache_hits'], results['cache_lookups']))
+
+
+if __name__ == '__main__':
+    main()
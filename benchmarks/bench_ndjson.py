@@ -0,0 +1,147 @@
+"""Micro-benchmark of decoding a streamed Ollama response.
+
+Compares the previous loop (requests' iter_lines, decode and json.loads per
+line, a closure per token) with ollama_lib.ndjson.iter_tokens, with and
+without the fast path that only pulls out the token text. Two transports
+are simulated: one line per read, as when the client keeps up with the
+model, and a response that is already buffered.
+
+    python benchmarks/bench_ndjson.py [--tokens 50000] [--json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_lib.ndjson import iter_tokens, READ_CHUNK_BYTES
+
+
+# Mostly plain words, some needing escapes or multi-byte characters
+TOKENS = [" the", " model", " returns", "\n", " \"quoted\"", " café", " data", " \U0001F600", " and", " more"]
+
+
+def response_lines(count):
+    lines = []
+    for i in range(count):
+        lines.append(json.dumps({
+            'model': 'llama3.2:latest', 'created_at': '2024-01-01T00:00:00.000000Z',
+            'response': TOKENS[i % len(TOKENS)], 'done': False
+        }, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n')
+    lines.append(json.dumps({
+        'model': 'llama3.2:latest', 'created_at': '2024-01-01T00:00:00.000000Z', 'response': '',
+        'done': True, 'eval_count': count, 'eval_duration': 1
+    }, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n')
+    return lines
+
+
+class LineReader:
+    # A raw stream that returns at most one line per read, like a chunked
+    # response read as the tokens arrive
+    def __init__(self, lines, per_read):
+        self.lines = lines
+        self.per_read = per_read
+        self.index = 0
+        self.buffer = b''
+        self.offset = 0
+
+    def read(self, size=-1, **kwargs):
+        if self.offset >= len(self.buffer):
+            if self.index >= len(self.lines):
+                return b''
+            self.buffer = b''.join(self.lines[self.index:self.index + self.per_read])
+            self.offset = 0
+            self.index += self.per_read
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = self.buffer[self.offset:self.offset + size]
+        self.offset += len(data)
+        return data
+
+
+def make_response(lines, per_read):
+    response = requests.models.Response()
+    response.raw = LineReader(lines, per_read)
+    response.status_code = 200
+    return response
+
+
+def legacy(lines, per_read):
+    # The loop RequestThread used before
+    parts = []
+    response = make_response(lines, per_read)
+    for line in response.iter_lines():
+        if line:
+            data = json.loads(line.decode('utf-8'))
+            text = data.get('response')
+
+            def handle_response(text=text):
+                parts.append(text)
+            handle_response()
+            if data.get('done'):
+                break
+    return ''.join(parts)
+
+
+def decoder(fast):
+    def run(lines, per_read):
+        parts = []
+        response = make_response(lines, per_read)
+        for text, data in iter_tokens(response.iter_content(chunk_size=READ_CHUNK_BYTES), 'response', fast):
+            if text is not None:
+                parts.append(text)
+            if data is not None and data.get('done'):
+                break
+        return ''.join(parts)
+    return run
+
+
+def best_of(runs, func, *args):
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=50000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    lines = response_lines(args.tokens)
+    expected = ''.join(TOKENS[i % len(TOKENS)] for i in range(args.tokens))
+    loops = [('legacy', legacy), ('decoder', decoder(False)), ('decoder_fast', decoder(True))]
+    transports = [('line_per_read', 1), ('buffered', len(lines))]
+
+    results = {'benchmark': 'ndjson', 'tokens': args.tokens, 'cases': {}}
+    for transport, per_read in transports:
+        for name, func in loops:
+            seconds, text = best_of(args.runs, func, lines, per_read)
+            results['cases']['{0}/{1}'.format(transport, name)] = {
+                'seconds': seconds,
+                'microseconds_per_token': seconds / args.tokens * 1e6,
+                'correct': text == expected
+            }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("{0} tokens".format(args.tokens))
+    for case, values in sorted(results['cases'].items()):
+        print("{0:<32} {1:8.3f}s  {2:6.2f} us/token{3}".format(
+            case, values['seconds'], values['microseconds_per_token'],
+            "" if values['correct'] else "  WRONG OUTPUT"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""End-to-end benchmarks of the plugin against a local mock Ollama server.
+
+Runs the plugin with stand-in sublime modules (see harness.py) and measures
+streaming through RequestThread (wall time, time to first token, UI
+dispatches per token, memory peak) and context assembly over a synthetic
+tree (cold and warm).
+
+    python benchmarks/bench_plugin.py [--json] [--output results.json]
+    python benchmarks/bench_plugin.py --baseline results.json [--tolerance 0.25]
+
+With --baseline the run fails when a measurement is worse than the baseline
+by more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import platform
+import contextlib
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness
+from mock_ollama import MockOllama
+
+
+# Measurements where more is worse, compared against a baseline
+REGRESSION_KEYS = (
+    'seconds', 'ttft', 'peak_kb', 'set_timeout_per_token', 'run_command_per_token',
+    'cold_seconds', 'warm_seconds'
+)
+
+STREAM_CASES = [
+    # name, tokens, characters per token, tokens per second (0: unlimited)
+    ('stream_burst', 2000, 4, 0),
+    ('stream_200tps', 400, 4, 200),
+    ('stream_large_tokens', 500, 64, 0)
+]
+
+WORDS = ("def class return import value result request response context "
+         "model stream token buffer cache index search history").split()
+
+
+def run_stream(plugin, loop, mock, tokens, token_chars, rate, measure_memory=False):
+    mock.tokens = tokens
+    mock.token_chars = token_chars
+    mock.rate = rate
+    view = harness.View("Some file content\n")
+    harness.counters.reset()
+
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    thread = plugin.RequestThread(view, mock.url, 'mock:latest', 'You are a benchmark.',
+                                  'Continue', view.text, use_cache=False, use_context_files=False)
+    thread.start()
+    thread.join()
+    loop.drain()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    counts = harness.counters.snapshot()
+    expected = ''.join(mock.token(i) for i in range(tokens))
+    result = {
+        'tokens': tokens,
+        'token_chars': token_chars,
+        'rate': rate,
+        'seconds': elapsed,
+        'ttft': thread.metrics.ttft if thread.metrics else None,
+        'client_tokens_per_second': tokens / elapsed if elapsed else None,
+        'set_timeout_per_token': counts.get('set_timeout', 0) / float(tokens),
+        'run_command_per_token': counts.get('run_command', 0) / float(tokens),
+        'view_edits': counts.get('view_edits', 0),
+        'complete': thread.completed and view.text.endswith(expected)
+    }
+    if peak is not None:
+        result['peak_kb'] = peak / 1024.0
+    return result
+
+
+def build_tree(root, files, file_bytes, seed=1):
+    rng = random.Random(seed)
+    extensions = ['py', 'js', 'md', 'txt']
+    for i in range(files):
+        directory = os.path.join(root, 'pkg{0}'.format(i % 20), 'sub{0}'.format(i % 7))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        words = []
+        size = 0
+        while size < file_bytes:
+            word = rng.choice(WORDS)
+            words.append(word)
+            size += len(word) + 1
+        with open(os.path.join(directory, 'f{0}.{1}'.format(i, extensions[i % 4])), 'w') as f:
+            f.write(' '.join(words))
+
+
+def run_context(plugin, files, file_bytes, measure_memory=False):
+    settings = plugin.sublime.load_settings('Ollama.sublime-settings')
+    extensions = settings.get('supported_extensions', [])
+    root = tempfile.mkdtemp(prefix='ollama-bench-tree-')
+    try:
+        build_tree(root, files, file_bytes)
+        paths = [os.path.join(root, '**')]
+        index = plugin.ContextIndex.get_instance()
+
+        def timed(func):
+            start = time.perf_counter()
+            value = func()
+            return time.perf_counter() - start, value
+
+        results = {}
+        index.clear()
+        cold, collected = timed(lambda: plugin.get_context_files(paths, extensions))
+        warm, _ = timed(lambda: plugin.get_context_files(paths, extensions))
+        results['get_context_files'] = {
+            'files': files, 'file_bytes': file_bytes, 'chars': len(collected),
+            'cold_seconds': cold, 'warm_seconds': warm
+        }
+
+        index.clear()
+        if measure_memory:
+            tracemalloc.start()
+        cold, bundle = timed(lambda: plugin.build_context(paths, extensions, 8192, 'explain the cache index', ''))
+        warm, _ = timed(lambda: plugin.build_context(paths, extensions, 8192, 'explain the cache index', ''))
+        results['build_context'] = {
+            'files': files, 'budget_tokens': 8192, 'tokens': bundle.tokens,
+            'cold_seconds': cold, 'warm_seconds': warm
+        }
+        if measure_memory:
+            results['build_context']['peak_kb'] = tracemalloc.get_traced_memory()[1] / 1024.0
+            tracemalloc.stop()
+        return results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, values in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name, {})
+        for key in REGRESSION_KEYS:
+            old = before.get(key)
+            new = values.get(key)
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append("{0}.{1}: {2:.4g} -> {3:.4g}".format(name, key, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=2000, help="files in the synthetic context tree")
+    parser.add_argument('--file-bytes', type=int, default=4096)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc passes")
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    parser.add_argument('--output', help="also write the results to this file")
+    parser.add_argument('--baseline', help="results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='ollama-bench-cache-')
+    mock = MockOllama().start()
+    # The plugin logs to stdout, which is kept for the results
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            loop = harness.install({
+                'ollamaUrl': mock.url,
+                'selected_model': 'mock:latest',
+                'metrics_log_enabled': False
+            }, cache_dir)
+            plugin = harness.load_plugin()
+
+            scenarios = {}
+            for name, tokens, token_chars, rate in STREAM_CASES:
+                scenarios[name] = run_stream(plugin, loop, mock, tokens, token_chars, rate)
+            if not args.no_memory:
+                memory = run_stream(plugin, loop, mock, 5000, 4, 0, measure_memory=True)
+                scenarios['stream_memory'] = {'tokens': memory['tokens'], 'peak_kb': memory['peak_kb']}
+            scenarios.update(run_context(plugin, args.files, args.file_bytes, not args.no_memory))
+            plugin.plugin_unloaded()
+    finally:
+        mock.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    results = {
+        'benchmark': 'plugin',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'scenarios': scenarios
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results['regressions'] = regressions
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, values in sorted(scenarios.items()):
+            print(name)
+            for key, value in sorted(values.items()):
+                print("    {0:<28} {1}".format(key, "{0:.4g}".format(value) if isinstance(value, float) else value))
+        for regression in regressions:
+            print("REGRESSION {0}".format(regression))
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
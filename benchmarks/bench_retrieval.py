@@ -0,0 +1,104 @@
+"""Time the on-disk embedding index used for context retrieval.
+
+Indexes synthetic chunks with random vectors (no server involved), then
+times an update with nothing to embed, an update after one file changed,
+reopening the index from disk and scoring every chunk against a query.
+
+    python benchmarks/bench_retrieval.py [--chunks 10000] [--dim 768] [--json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_lib.context_builder import Chunk
+from ollama_lib.vector_index import VectorIndex
+
+
+CHUNKS_PER_FILE = 10
+
+
+def make_chunks(count, revision=0):
+    return [Chunk('file{0}.py'.format(i // CHUNKS_PER_FILE), i % CHUNKS_PER_FILE,
+                  "def function_{0}_{1}(value):\n    return value * {0}\n".format(i, revision if i < CHUNKS_PER_FILE else 0))
+            for i in range(count)]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=10000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    embedded = []
+
+    def embed(texts):
+        embedded.append(len(texts))
+        return [[rng.gauss(0, 1) for _ in range(args.dim)] for _ in texts]
+
+    directory = tempfile.mkdtemp(prefix='ollama-bench-')
+    try:
+        chunks = make_chunks(args.chunks)
+        index = VectorIndex()
+        index.configure(directory)
+        build_time, _ = timed(index.update, chunks, embed)
+        unchanged_time, _ = timed(index.update, chunks, embed)
+
+        # The first file changes; only its chunks are embedded again
+        changed = make_chunks(args.chunks, 1)
+        changed_time, reembedded = timed(index.update, changed, embed)
+
+        index.close()
+        reopened = VectorIndex()
+        reopened.configure(directory)
+        query = embed(['query'])[0]
+        cold_time, _ = timed(reopened.scores, changed, query)
+        score_time, scores = timed(reopened.scores, changed, query)
+        size = os.path.getsize(os.path.join(directory, 'vectors.f32'))
+        reopened.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    results = {
+        'benchmark': 'retrieval',
+        'chunks': args.chunks,
+        'dim': args.dim,
+        'index_build_seconds': build_time,
+        'update_unchanged_ms': unchanged_time * 1000,
+        'update_one_file_ms': changed_time * 1000,
+        'chunks_reembedded': reembedded,
+        'score_cold_ms': cold_time * 1000,
+        'score_ms': score_time * 1000,
+        'vectors_mb': size / 1024.0 / 1024.0,
+        'scored': sum(1 for score in scores if score)
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("{0} chunks of {1} dimensions, {2:.1f} MB of vectors".format(args.chunks, args.dim, results['vectors_mb']))
+    print("Index build (incl. fake embedding): {0:8.3f}s".format(build_time))
+    print("Update, nothing changed:            {0:8.2f}ms".format(results['update_unchanged_ms']))
+    print("Update, one file changed:           {0:8.2f}ms ({1} chunks embedded)".format(
+        results['update_one_file_ms'], reembedded))
+    print("Scoring after reopening:            {0:8.2f}ms".format(results['score_cold_ms']))
+    print("Scoring:                            {0:8.2f}ms".format(results['score_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Time search-as-you-type queries over a large prompt history.
+
+Fills a history store with synthetic prompts (50k by default), builds the
+search index and times every prefix of a few queries, as typed.
+
+    python benchmarks/bench_search.py [--entries 50000] [--json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_lib.history import HistoryStore
+from ollama_lib.search import PromptSearch
+
+
+WORDS = [
+    "summarize", "translate", "refactor", "explain", "function", "class", "test",
+    "error", "python", "javascript", "french", "german", "review", "document",
+    "optimize", "query", "database", "the", "this", "code", "text", "bug", "fix",
+    "performance", "memory", "cache", "thread", "request", "response", "parser"
+]
+
+MODELS = ["llama3.2:latest", "phi4:latest", "qwen2.5-coder:7b", "mistral:latest"]
+
+QUERIES = ["refactor parser", "translte french", "memory cache bug", "qwen"]
+
+
+def fill(store, count, seed=1):
+    rng = random.Random(seed)
+    for i in range(count):
+        prompt = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14)))
+        entry_id = store.append("{0} #{1}".format(prompt, i), rng.choice(MODELS))
+        response = " ".join(rng.choice(WORDS) for _ in range(40))
+        store.update(entry_id, response=response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='ollama-bench-')
+    try:
+        store = HistoryStore()
+        store.configure(os.path.join(directory, 'history.jsonl'), args.entries)
+        start = time.perf_counter()
+        fill(store, args.entries)
+        fill_time = time.perf_counter() - start
+
+        search = PromptSearch(store)
+        start = time.perf_counter()
+        search.search('')
+        build_time = time.perf_counter() - start
+
+        timings = []
+        for query in QUERIES:
+            for end in range(1, len(query) + 1):
+                start = time.perf_counter()
+                matches = search.search(query[:end], limit=20)
+                timings.append((query[:end], time.perf_counter() - start, len(matches)))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    values = sorted(timing for _, timing, _ in timings)
+    results = {
+        'benchmark': 'search',
+        'entries': args.entries,
+        'history_fill_seconds': fill_time,
+        'index_build_seconds': build_time,
+        'keystrokes': len(values),
+        'query_p50_ms': values[len(values) // 2] * 1000,
+        'query_max_ms': values[-1] * 1000,
+        'slowest': max(timings, key=lambda timing: timing[1])[0]
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("History: {0} entries, written in {1:.2f}s".format(args.entries, fill_time))
+    print("Index build:     {0:8.3f}s".format(build_time))
+    print("Per keystroke:   p50 {0:.2f}ms, max {1:.2f}ms ('{2}')".format(
+        results['query_p50_ms'], results['query_max_ms'], results['slowest']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Measure plugin load time and the per-command overhead of reading settings.
+
+Load time is measured in fresh interpreters: importing the plugin module,
+then plugin_loaded. Dispatch overhead runs a few commands against a mock
+Ollama server and counts the settings API calls they make; in Sublime each
+of those is a call from the plugin host into the editor.
+
+    python benchmarks/bench_startup.py [--runs 5] [--json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness
+from mock_ollama import MockOllama
+
+
+def child():
+    # One cold load, reported as JSON on stdout
+    before = set(sys.modules)
+    start = time.perf_counter()
+    harness.install({'preload_models': False})
+    with contextlib.redirect_stdout(sys.stderr):
+        package = harness.types.ModuleType(harness.PACKAGE)
+        package.__path__ = [harness.ROOT]
+        sys.modules[harness.PACKAGE] = package
+        import_start = time.perf_counter()
+        __import__(harness.PACKAGE + '.ollama')
+        imported = time.perf_counter()
+        requests_imported = 'requests' in sys.modules
+        sys.modules[harness.PACKAGE + '.ollama'].plugin_loaded()
+        loaded = time.perf_counter()
+    print(json.dumps({
+        'import_ms': (imported - import_start) * 1000,
+        'plugin_loaded_ms': (loaded - imported) * 1000,
+        'total_ms': (loaded - start) * 1000,
+        'modules_loaded': len(set(sys.modules) - before),
+        'requests_imported': requests_imported
+    }))
+
+
+def measure_load(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child'],
+                                         stderr=subprocess.DEVNULL)
+        samples.append(json.loads(output.decode('utf-8')))
+    result = {}
+    for key in ('import_ms', 'plugin_loaded_ms', 'total_ms'):
+        values = sorted(sample[key] for sample in samples)
+        result[key] = values[len(values) // 2]
+    result['modules_loaded'] = samples[-1]['modules_loaded']
+    result['requests_imported'] = samples[-1]['requests_imported']
+    return result
+
+
+def count(func):
+    harness.counters.reset()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    counts = harness.counters.snapshot()
+    return {
+        'ms': elapsed * 1000,
+        'load_settings': counts.get('load_settings', 0),
+        'settings_get': counts.get('settings_get', 0)
+    }
+
+
+def measure_dispatch(runs):
+    mock = MockOllama(tokens=20).start()
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            loop = harness.install({
+                'ollamaUrl': mock.url,
+                'selected_model': 'mock:latest',
+                'preload_models': False,
+                'metrics_log_enabled': False,
+                'prefetch_context': False
+            })
+            plugin = harness.load_plugin()
+            time.sleep(0.2)
+            loop.drain()
+            view = harness.View("Some file content\n")
+
+            def request():
+                thread = plugin.RequestThread(view, None, 'mock:latest', 'You are a benchmark.',
+                                              'Continue', view.text, use_cache=False)
+                thread.start()
+                thread.join()
+                loop.drain()
+
+            def ask():
+                # The UI thread part of Ask Any, up to handing the request off
+                command = plugin.OllamaAskAnyCommand(view)
+                command.run(None, prompt='Continue')
+                command_done = time.perf_counter()
+                scheduler = plugin.RequestScheduler.get_instance()
+                deadline = time.time() + 10
+                while scheduler.jobs() and time.time() < deadline:
+                    time.sleep(0.01)
+                loop.drain()
+                return command_done
+
+            request()
+            results = {'request': count(request)}
+
+            ask()
+            timings = []
+            for _ in range(runs):
+                harness.counters.reset()
+                start = time.perf_counter()
+                timings.append(ask() - start)
+            counts = harness.counters.snapshot()
+            results['ask_any'] = {
+                'ui_ms': sorted(timings)[len(timings) // 2] * 1000,
+                'load_settings': counts.get('load_settings', 0),
+                'settings_get': counts.get('settings_get', 0)
+            }
+            plugin.plugin_unloaded()
+    finally:
+        mock.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    results = {'benchmark': 'startup', 'load': measure_load(args.runs), 'dispatch': measure_dispatch(args.runs)}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    load = results['load']
+    print("Plugin load (median of {0}): import {1:.1f}ms, plugin_loaded {2:.1f}ms, {3} modules, requests {4} by the import".format(
+        args.runs, load['import_ms'], load['plugin_loaded_ms'], load['modules_loaded'],
+        "imported" if load['requests_imported'] else "not imported"))
+    for name, values in sorted(results['dispatch'].items()):
+        print("{0:<10} {1}".format(name, ", ".join(
+            "{0} {1}".format(key, "{0:.2f}".format(value) if isinstance(value, float) else value)
+            for key, value in sorted(values.items()))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+"""Run the plugin outside Sublime Text.
+
+Installs stand-ins for the ``sublime`` and ``sublime_plugin`` modules, with
+a main loop thread that runs ``set_timeout`` callbacks in order and counts
+every dispatch to the UI, then imports the plugin package from this
+repository.
+"""
+import os
+import re
+import sys
+import json
+import heapq
+import time
+import types
+import tempfile
+import threading
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PACKAGE = 'Ollama'
+
+
+class Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.values = {}
+
+    def add(self, name, count=1):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + count
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.values)
+
+
+counters = Counters()
+
+
+class MainLoop:
+    # Plays the role of Sublime's UI thread: callbacks run one at a time,
+    # in order of their due time
+    def __init__(self):
+        self._queue = []
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def call_later(self, callback, delay_ms):
+        with self._condition:
+            self._sequence += 1
+            heapq.heappush(self._queue, (time.time() + delay_ms / 1000.0, self._sequence, callback))
+            self._condition.notify()
+
+    def drain(self, timeout=5.0):
+        # Waits until every callback that is due has run
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._condition:
+                if not self._queue:
+                    return True
+            time.sleep(0.005)
+        return False
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                due, _, callback = self._queue[0]
+                wait = due - time.time()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._queue)
+            try:
+                callback()
+            except Exception as e:
+                print("Callback failed: {0!r}".format(e))
+
+
+def strip_comments(text):
+    # Sublime settings files are JSON with // comments
+    return re.sub(r'^\s*//.*$', '', text, flags=re.MULTILINE)
+
+
+class Settings(dict):
+    # Every get crosses into the editor in Sublime, so calls are counted
+    def get(self, key, default=None):
+        counters.add('settings_get')
+        return dict.get(self, key, default)
+
+    def to_dict(self):
+        counters.add('settings_to_dict')
+        return dict(self)
+
+    def set(self, key, value):
+        self[key] = value
+        self._changed()
+
+    def erase(self, key):
+        self.pop(key, None)
+        self._changed()
+
+    def has(self, key):
+        return key in self
+
+    def add_on_change(self, key, callback):
+        self.__dict__.setdefault('callbacks', {})[key] = callback
+
+    def clear_on_change(self, key):
+        self.__dict__.setdefault('callbacks', {}).pop(key, None)
+
+    def _changed(self):
+        for callback in list(self.__dict__.get('callbacks', {}).values()):
+            callback()
+
+
+class Region:
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return abs(self.b - self.a)
+
+    def __len__(self):
+        return self.size()
+
+    def empty(self):
+        return self.a == self.b
+
+
+class Selection(list):
+    def clear(self):
+        del self[:]
+
+    def add(self, region):
+        self.append(region)
+
+
+class View:
+    _next_id = 1
+
+    def __init__(self, text=''):
+        self.text = text
+        self._id = View._next_id
+        View._next_id += 1
+        self.selection = Selection([Region(len(text))])
+        self.status = {}
+        self._settings = Settings()
+        self._change_count = 0
+        self._last_command = (None, None, 0)
+        # key -> phantoms currently shown by a PhantomSet
+        self.phantoms = {}
+
+    def id(self):
+        return self._id
+
+    def is_valid(self):
+        return True
+
+    def window(self):
+        return None
+
+    def file_name(self):
+        return None
+
+    def name(self):
+        return 'benchmark'
+
+    def settings(self):
+        return self._settings
+
+    def sel(self):
+        return self.selection
+
+    def size(self):
+        return len(self.text)
+
+    def change_count(self):
+        return self._change_count
+
+    def command_history(self, index, modifying_only=False):
+        return self._last_command
+
+    def is_read_only(self):
+        return False
+
+    def substr(self, region):
+        return self.text[region.begin():region.end()]
+
+    def insert(self, edit, point, text):
+        counters.add('view_edits')
+        self._change_count += 1
+        self.text = self.text[:point] + text + self.text[point:]
+        # Like Sublime, carets at or after the insertion point move with the text
+        for i, region in enumerate(self.selection):
+            if region.begin() >= point:
+                self.selection[i] = Region(region.a + len(text), region.b + len(text))
+        return len(text)
+
+    def replace(self, edit, region, text):
+        counters.add('view_edits')
+        self._change_count += 1
+        self.text = self.text[:region.begin()] + text + self.text[region.end():]
+
+    def set_status(self, key, value):
+        counters.add('status_updates')
+        self.status[key] = value
+
+    def erase_status(self, key):
+        counters.add('status_updates')
+        self.status.pop(key, None)
+
+    def run_command(self, name, args=None):
+        counters.add('run_command')
+        args = args or {}
+        self._last_command = (name, args, 1)
+        if name in ('insert', 'append'):
+            self.insert(None, self.size() if name == 'append' else self.selection[0].begin(),
+                        args.get('characters', ''))
+            return
+        if name == 'left_delete':
+            point = self.selection[0].begin()
+            if point:
+                self.replace(None, Region(point - 1, point), '')
+                self.selection[0] = Region(point - 1)
+            return
+        command = text_commands().get(name)
+        if command is not None:
+            command(self).run(None, **args)
+
+
+class Phantom:
+    def __init__(self, region, content, layout, on_navigate=None):
+        self.region = region
+        self.content = content
+        self.layout = layout
+
+
+class PhantomSet:
+    def __init__(self, view, key=''):
+        self.view = view
+        self.key = key
+
+    def update(self, phantoms):
+        counters.add('phantom_updates')
+        self.view.phantoms[self.key] = list(phantoms)
+
+
+def text_commands():
+    plugin = sys.modules.get(PACKAGE + '.ollama')
+    commands = {}
+    if plugin is None:
+        return commands
+    base = sys.modules['sublime_plugin'].TextCommand
+    for name, value in vars(plugin).items():
+        if isinstance(value, type) and issubclass(value, base) and name.endswith('Command'):
+            command = re.sub(r'(?<!^)(?=[A-Z])', '_', name[:-len('Command')]).lower()
+            commands[command] = value
+    return commands
+
+
+def install(settings=None, cache_dir=None):
+    # Returns the main loop; settings override the defaults shipped in
+    # Ollama.sublime-settings
+    loop = MainLoop()
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix='ollama-bench-cache-')
+
+    with open(os.path.join(ROOT, 'Ollama.sublime-settings'), 'r', encoding='utf-8') as f:
+        defaults = Settings(json.loads(strip_comments(f.read())))
+    defaults.update(settings or {})
+    all_settings = {'Ollama.sublime-settings': defaults}
+
+    sublime = types.ModuleType('sublime')
+    sublime.Region = Region
+    sublime.Phantom = Phantom
+    sublime.PhantomSet = PhantomSet
+    sublime.HIDDEN = 128
+    sublime.LAYOUT_INLINE = 0
+    sublime.LAYOUT_BELOW = 1
+    sublime.LAYOUT_BLOCK = 2
+    sublime.OP_EQUAL = 0
+    sublime.OP_NOT_EQUAL = 1
+
+    def set_timeout(callback, delay=0):
+        counters.add('set_timeout')
+        loop.call_later(callback, delay)
+
+    def set_timeout_async(callback, delay=0):
+        counters.add('set_timeout_async')
+        threading.Timer(delay / 1000.0, callback).start()
+
+    sublime.set_timeout = set_timeout
+    sublime.set_timeout_async = set_timeout_async
+    def load_settings(name):
+        counters.add('load_settings')
+        return all_settings.setdefault(name, Settings())
+
+    sublime.load_settings = load_settings
+    sublime.save_settings = lambda name: counters.add('save_settings')
+    sublime.status_message = lambda text: counters.add('status_messages')
+    sublime.error_message = lambda text: print("Error dialog: {0}".format(text))
+    sublime.message_dialog = lambda text: None
+    sublime.cache_path = lambda: cache_dir
+    sublime.packages_path = lambda: cache_dir
+    sublime.active_window = lambda: None
+    sublime.windows = lambda: []
+
+    sublime_plugin = types.ModuleType('sublime_plugin')
+
+    class ApplicationCommand:
+        pass
+
+    class WindowCommand:
+        def __init__(self, window=None):
+            self.window = window
+
+    class TextCommand:
+        def __init__(self, view=None):
+            self.view = view
+
+    class EventListener:
+        pass
+
+    class ViewEventListener:
+        def __init__(self, view=None):
+            self.view = view
+
+    for cls in (ApplicationCommand, WindowCommand, TextCommand, EventListener, ViewEventListener):
+        setattr(sublime_plugin, cls.__name__, cls)
+
+    sys.modules['sublime'] = sublime
+    sys.modules['sublime_plugin'] = sublime_plugin
+    return loop
+
+
+def load_plugin():
+    # The repository is the package directory Sublime loads as "Ollama"
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [ROOT]
+        sys.modules[PACKAGE] = package
+    __import__(PACKAGE + '.ollama')
+    plugin = sys.modules[PACKAGE + '.ollama']
+    plugin.plugin_loaded()
+    return plugin
@@ -0,0 +1,209 @@
+"""A local stand-in for the Ollama HTTP API.
+
+Serves /api/tags and /api/embed, and streams /api/generate and /api/chat
+responses at a configurable token rate and token size. It can be used by the benchmarks
+or run on its own to try the plugin without a model:
+
+    python benchmarks/mock_ollama.py [--port 11434] [--tokens 500] [--rate 100]
+"""
+import re
+import json
+import time
+import zlib
+import argparse
+import threading
+from collections import OrderedDict
+
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+    class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+
+MODELS = [
+    {
+        'name': 'mock:latest',
+        'size': 4700000000,
+        'details': {'family': 'llama', 'parameter_size': '8B', 'quantization_level': 'Q4_0'}
+    }
+]
+
+CREATED_AT = '2024-01-01T00:00:00.000000Z'
+
+EMBEDDING_DIM = 64
+
+
+def embedding(text):
+    # Hashed bag of words: texts sharing words get similar vectors
+    vector = [0.0] * EMBEDDING_DIM
+    for word in re.findall(r'[a-z0-9]+', text.lower()):
+        vector[zlib.crc32(word.encode('utf-8')) % EMBEDDING_DIM] += 1.0
+    return vector
+
+
+class MockOllama:
+    # tokens: tokens per response, token_chars: characters per token,
+    # rate: tokens per second (0 streams as fast as possible),
+    # first_token_delay: seconds before the first token (prompt evaluation)
+    def __init__(self, port=0, tokens=200, token_chars=4, rate=0, first_token_delay=0.0):
+        self.tokens = tokens
+        self.token_chars = token_chars
+        self.rate = rate
+        self.first_token_delay = first_token_delay
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}'.format(self.server.server_port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def record(self, path, body):
+        with self._lock:
+            self.requests.append((path, body))
+
+    def token(self, index):
+        # Words of the configured size, so responses look like text
+        word = 'tok{0}'.format(index)
+        word = (word * (self.token_chars // len(word) + 1))[:max(self.token_chars - 1, 1)]
+        return ' ' + word
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, data):
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def read_body(self):
+                if self.headers.get('Transfer-Encoding') == 'chunked':
+                    parts = []
+                    while True:
+                        size = int(self.rfile.readline().strip(), 16)
+                        if not size:
+                            self.rfile.readline()
+                            break
+                        parts.append(self.rfile.read(size))
+                        self.rfile.readline()
+                    raw = b''.join(parts)
+                else:
+                    raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                return json.loads(raw.decode('utf-8')) if raw else {}
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self.send_json({'models': MODELS})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                body = self.read_body()
+                mock.record(self.path, body)
+                if self.path not in ('/api/generate', '/api/chat', '/api/embed'):
+                    self.send_error(404)
+                    return
+
+                if self.path == '/api/embed':
+                    texts = body.get('input', [])
+                    if not isinstance(texts, list):
+                        texts = [texts]
+                    self.send_json({'model': body.get('model'), 'embeddings': [embedding(text) for text in texts]})
+                    return
+
+                chat = self.path == '/api/chat'
+                if body.get('stream', True) is False:
+                    self.send_json(self.message(chat, '', True))
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                started = time.time()
+                if mock.first_token_delay:
+                    time.sleep(mock.first_token_delay)
+                try:
+                    for i in range(mock.tokens):
+                        if mock.rate:
+                            delay = started + mock.first_token_delay + i / mock.rate - time.time()
+                            if delay > 0:
+                                time.sleep(delay)
+                        self.write_chunk(self.message(chat, mock.token(i), False))
+                    done = self.message(chat, '', True)
+                    elapsed = int((time.time() - started) * 1e9)
+                    done.update({
+                        'prompt_eval_count': 10,
+                        'prompt_eval_duration': int(mock.first_token_delay * 1e9),
+                        'eval_count': mock.tokens,
+                        'eval_duration': max(elapsed - int(mock.first_token_delay * 1e9), 1),
+                        'load_duration': 0,
+                        'total_duration': elapsed
+                    })
+                    self.write_chunk(done)
+                    self.wfile.write(b'0\r\n\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled the request
+                    pass
+
+            def message(self, chat, text, done):
+                # Same field order as Ollama: the text, then done
+                if chat:
+                    return OrderedDict([('model', 'mock:latest'), ('created_at', CREATED_AT),
+                                        ('message', {'role': 'assistant', 'content': text}), ('done', done)])
+                return OrderedDict([('model', 'mock:latest'), ('created_at', CREATED_AT),
+                                    ('response', text), ('done', done)])
+
+            def write_chunk(self, data):
+                # Compact like the Go encoder Ollama uses
+                line = (json.dumps(data, separators=(',', ':')) + '\n').encode('utf-8')
+                self.wfile.write('{0:x}\r\n'.format(len(line)).encode('ascii') + line + b'\r\n')
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--tokens', type=int, default=500)
+    parser.add_argument('--token-chars', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=100, help="tokens per second, 0 for no limit")
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    args = parser.parse_args()
+
+    mock = MockOllama(args.port, args.tokens, args.token_chars, args.rate, args.first_token_delay)
+    print("Mock Ollama listening on {0}".format(mock.url))
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,368 @@
 import sublime
 import sublime_plugin
-import requests
 import json
 import threading
 import datetime
+import time
+import hashlib
+import heapq
+import html
 import os
-import fnmatch
+
+from .ollama_lib.context_index import ContextIndex
+from .ollama_lib.pathmatch import PathMatcher, DEFAULT_IGNORED_DIRS
+from .ollama_lib.context_builder import ContextBuilder, CHARS_PER_TOKEN
+from .ollama_lib.vector_index import VectorIndex
+from .ollama_lib.client import OllamaClient
+from .ollama_lib.models import ModelCatalog
+from .ollama_lib.endpoints import EndpointPool
+from .ollama_lib.response_cache import ResponseCache, request_key
+from .ollama_lib.conversations import ConversationStore
+from .ollama_lib.telemetry import RequestMetrics, MetricsLog, format_summary
+from .ollama_lib.warmup import ModelWarmer
+from .ollama_lib.completion import CompletionCache, completion_payload
+from .ollama_lib.prompt_body import PromptText, JsonBody
+from .ollama_lib.ndjson import iter_tokens, READ_CHUNK_BYTES
+from .ollama_lib.chunking import split_structural
+from .ollama_lib.history import HistoryStore, text_hash, format_timestamp
+from .ollama_lib.search import PromptSearch
+from .ollama_lib.settings import SettingsSnapshot
+from .ollama_lib.state import StateStore
+from .ollama_lib.scheduler import RequestScheduler, PRIORITY_INTERACTIVE, PRIORITY_BATCH, STATE_QUEUED, STATE_RUNNING
+
+
+settings_snapshot = None
+
+def get_settings():
+    # For reading only; changes go through set_state, or sublime.load_settings
+    # and SettingsWriter for the user's configuration
+    if settings_snapshot is None:
+        refresh_settings()
+    return settings_snapshot
+
+def refresh_settings():
+    global settings_snapshot
+    settings_snapshot = SettingsSnapshot.of(
+        sublime.load_settings('Ollama.sublime-settings'),
+        configure_state().values()
+    )
+
+def configure_state():
+    state = StateStore.get_instance()
+    state.configure(os.path.join(sublime.cache_path(), 'Ollama', 'state.json'))
+    return state
+
+def set_state(key, value):
+    # Selected model, context paths and toggles change as the plugin is used;
+    # they override the settings and are saved apart from them
+    configure_state().set(key, value)
+
+def on_state_changed(key, value):
+    refresh_settings()
+
+class SettingsWriter:
+    # Coalesces saves of the settings file requested within a short window
+    DELAY_MS = 500
+    pending = False
+    
+    @classmethod
+    def save(cls):
+        if not cls.pending:
+            cls.pending = True
+            sublime.set_timeout(cls.flush, cls.DELAY_MS)
+    
+    @classmethod
+    def flush(cls):
+        if cls.pending:
+            cls.pending = False
+            sublime.save_settings('Ollama.sublime-settings')
+
+def on_settings_changed():
+    refresh_settings()
+    configure_client()
+    configure_scheduler()
+    configure_catalog()
+    configure_context_index()
+
+def context_cache_file():
+    return os.path.join(sublime.cache_path(), 'Ollama', 'context_index.json')
+
+def configure_context_index():
+    settings = get_settings()
+    max_bytes = settings.get('context_cache_size_mb', 64) * 1024 * 1024
+    ContextBuilder.get_instance().set_max_bytes(max_bytes)
+    index = ContextIndex.get_instance()
+    index.configure(
+        max_bytes=max_bytes,
+        max_file_bytes=settings.get('context_max_file_kb', 512) * 1024,
+        workers=settings.get('context_read_workers', 8),
+        ignored_dirs=settings.get('context_ignored_dirs', DEFAULT_IGNORED_DIRS),
+        use_ignore_files=settings.get('context_use_ignore_files', True)
+    )
+    return index
+
+def configure_client():
+    settings = get_settings()
+    OllamaClient.get_instance().configure(
+        connect_timeout=settings.get('http_connect_timeout', 5),
+        read_timeout=settings.get('http_read_timeout', 300),
+        retries=settings.get('http_retries', 2),
+        backoff=settings.get('http_retry_backoff', 0.5),
+        pool_size=settings.get('http_pool_size', 4)
+    )
+
+def configure_endpoints():
+    settings = get_settings()
+    urls = settings.get('ollama_endpoints') or [settings.get('ollamaUrl', 'http://localhost:11434')]
+    pool = EndpointPool.get_instance()
+    pool.configure(
+        urls,
+        strategy=settings.get('endpoint_strategy', 'least_outstanding'),
+        health_interval=settings.get('endpoint_health_interval', 60),
+        down_seconds=settings.get('endpoint_retry_after', 15)
+    )
+    return pool
+
+def configure_catalog():
+    settings = get_settings()
+    catalog = ModelCatalog.get_instance()
+    catalog.configure(
+        configure_endpoints().urls(),
+        settings.get('model_cache_ttl', 300)
+    )
+    return catalog
+
+def fetch_models(callback, on_error=None):
+    # Calls back on the UI thread with the cached models, loading them in
+    # the background first if the cache is empty
+    catalog = configure_catalog()
+    if catalog.models:
+        callback(catalog.models)
+        if catalog.is_stale():
+            catalog.refresh_async()
+        return
+
+    def on_refreshed(error):
+        if error is None:
+            callback(catalog.models)
+        elif on_error:
+            on_error(error)
+
+    sublime.status_message("Ollama: Loading models...")
+    catalog.refresh_async(lambda error: sublime.set_timeout(lambda: on_refreshed(error), 0))
+
+def model_items(models, extra_items=()):
+    items = [[item, ""] for item in extra_items]
+    items.extend([model.name, model.describe()] for model in models)
+    return items
+
+def configure_scheduler():
+    settings = get_settings()
+    RequestScheduler.get_instance().configure(settings.get('max_concurrent_requests', 2))
+
+def submit_request(thread, priority=PRIORITY_INTERACTIVE):
+    scheduler = RequestScheduler.get_instance()
+    scheduler.submit(thread, priority)
+    if thread.state == STATE_QUEUED:
+        ahead = scheduler.queued_ahead(thread)
+        thread.set_status('Ollama: Queued request for {0} ({1} ahead)...'.format(thread.model, ahead))
+
+def configure_response_cache():
+    settings = get_settings()
+    cache = ResponseCache.get_instance()
+    cache.configure(
+        os.path.join(sublime.cache_path(), 'Ollama', 'responses'),
+        settings.get('response_cache_size_mb', 32) * 1024 * 1024,
+        settings.get('response_cache_ttl', 7 * 24 * 3600)
+    )
+    return cache
+
+def store_response(cache, key, response, model):
+    try:
+        cache.put(key, response, model)
+    except Exception as e:
+        print("Ollama Error: Could not cache response: {0}".format(str(e)))
+
+def configure_metrics_log():
+    settings = get_settings()
+    log = MetricsLog.get_instance()
+    log.configure(
+        os.path.join(sublime.cache_path(), 'Ollama', 'metrics.jsonl'),
+        settings.get('metrics_log_max_entries', 5000)
+    )
+    return log
+
+def record_metrics(metrics, quiet=False):
+    if not quiet:
+        summary = metrics.summary()
+        print("Ollama: {0}".format(summary))
+        sublime.set_timeout(lambda: sublime.status_message("Ollama: {0}".format(summary)), 0)
+    
+    settings = get_settings()
+    if settings.get('metrics_log_enabled', True):
+        try:
+            configure_metrics_log().append(metrics)
+        except Exception as e:
+            print("Ollama Error: Could not write metrics: {0}".format(str(e)))
+
+def configure_history():
+    settings = get_settings()
+    store = HistoryStore.get_instance()
+    store.configure(
+        os.path.join(sublime.cache_path(), 'Ollama', 'history.jsonl'),
+        settings.get('history_max_entries', 10000)
+    )
+    return store
+
+def load_history():
+    # Runs once at startup: moves the history kept in the settings file by
+    # earlier versions into the store and loads its index
+    settings = sublime.load_settings('Ollama.sublime-settings')
+    store = configure_history()
+    legacy = settings.get('history', [])
+    if not legacy:
+        store.is_empty()
+        return
+    if store.is_empty():
+        for h in reversed(legacy):
+            try:
+                timestamp = time.mktime(datetime.datetime.strptime(h['timestamp'], '%Y-%m-%d %H:%M:%S').timetuple())
+            except (KeyError, ValueError):
+                timestamp = None
+            store.append(h['prompt'], h.get('model'), timestamp=timestamp)
+    settings.erase('history')
+    SettingsWriter.save()
+
+def record_history(prompt, model):
+    try:
+        return configure_history().append(prompt, model)
+    except Exception as e:
+        print("Ollama Error: Could not write history: {0}".format(str(e)))
+
+def record_history_result(entry_id, thread):
+    settings = get_settings()
+    max_chars = settings.get('history_response_chars', 2000)
+    fields = {
+        'status': 'cancelled' if thread.cancelled else 'done' if thread.completed else 'failed',
+        'context_hash': thread.context_hash
+    }
+    if thread.result and max_chars:
+        fields['response'] = thread.result[:max_chars]
+    if thread.metrics:
+        metrics = thread.metrics.to_dict()
+        for field in ('elapsed', 'ttft', 'tokens_per_second', 'eval_count'):
+            if metrics.get(field) is not None:
+                fields[field] = metrics[field]
+    try:
+        configure_history().update(entry_id, **fields)
+    except Exception as e:
+        print("Ollama Error: Could not write history: {0}".format(str(e)))
+
+prompt_search = None
+
+def get_prompt_search():
+    global prompt_search
+    if prompt_search is None:
+        prompt_search = PromptSearch(configure_history())
+    return prompt_search
+
+def prepare_prompt_search():
+    # Builds the index while the first characters are typed
+    get_prompt_search().prepare()
+
+def search_prompts(query, limit=50):
+    settings = get_settings()
+    return get_prompt_search().search(query, settings.get('templates', []), limit)
+
+def resolve_keep_alive(settings, model, keep_alive=None):
+    # Template value, then per-model setting, then the global default
+    if keep_alive is not None:
+        return keep_alive
+    model_keep_alive = settings.get('model_keep_alive', {})
+    if model in model_keep_alive:
+        return model_keep_alive[model]
+    return settings.get('keep_alive')
+
+def preload_model(model, keep_alive=None, min_interval=0):
+    settings = get_settings()
+    if not model or not settings.get('preload_models', True):
+        return
+    # Warm the server the next request for the model would go to
+    endpoint = EndpointPool.get_instance().choose(model)
+    if endpoint is None:
+        return
+    ModelWarmer.get_instance().preload(
+        endpoint.url,
+        model,
+        resolve_keep_alive(settings, model, keep_alive),
+        min_interval
+    )
+
+class KeepWarm:
+    # Periodically re-warms the selected model while the editor is in use
+    last_activity = 0
+    running = False
+    
+    @classmethod
+    def touch(cls):
+        if not get_settings().get('keep_warm_interval', 0):
+            return
+        cls.last_activity = time.time()
+        if not cls.running:
+            cls.running = True
+            sublime.set_timeout_async(cls.tick, 0)
+    
+    @classmethod
+    def tick(cls):
+        settings = get_settings()
+        interval = settings.get('keep_warm_interval', 0)
+        if not interval or time.time() - cls.last_activity > interval:
+            # Idle or disabled: stop until the next activity
+            cls.running = False
+            return
+        
+        preload_model(settings.get('selected_model'), min_interval=interval)
+        sublime.set_timeout_async(cls.tick, int(interval * 1000))
+
+class OllamaKeepWarmListener(sublime_plugin.EventListener):
+    def on_activated_async(self, view):
+        KeepWarm.touch()
+    
+    def on_modified_async(self, view):
+        KeepWarm.touch()
+
+def plugin_loaded():
+    configure_state().add_listener(on_state_changed)
+    refresh_settings()
+    sublime.load_settings('Ollama.sublime-settings').add_on_change('ollama_settings', on_settings_changed)
+    settings = get_settings()
+    configure_client()
+    configure_scheduler()
+    configure_catalog().refresh_async()
+    index = configure_context_index()
+    if settings.get('context_cache_persist', False):
+        sublime.set_timeout_async(lambda: index.load(context_cache_file()), 0)
+    sublime.set_timeout_async(load_history, 0)
+
+def plugin_unloaded():
+    sublime.load_settings('Ollama.sublime-settings').clear_on_change('ollama_settings')
+    state = configure_state()
+    state.remove_listener(on_state_changed)
+    state.flush()
+    SettingsWriter.flush()
+    settings = get_settings()
+    if prompt_search is not None:
+        prompt_search.close()
+    RequestScheduler.get_instance().cancel_all()
+    InlineCompletion.discard_all()
+    OllamaClient.get_instance().close()
+    ContextIndex.get_instance().close()
+    VectorIndex.get_instance().close()
+    if settings.get('context_cache_persist', False):
+        try:
+            ContextIndex.get_instance().save(context_cache_file())
+        except Exception as e:
+            print("Ollama Error: {0}".format(str(e)))
 
 class OllamaOutputPanel:
     _instance = None
@@ -90,67 +447,158 @@ class OllamaAppendTextCommand(sublime_plugin.TextCommand):
 
 class OllamaSelectModelCommand(sublime_plugin.ApplicationCommand):
     def run(self):
-        settings = sublime.load_settings('Ollama.sublime-settings')
-        url = settings.get('ollamaUrl', 'http://localhost:11434')
-        
-        try:
-            response = requests.get("{0}/api/tags".format(url))
-            models = [model['name'] for model in response.json()['models']]
+        def on_models(models):
+            if not models:
+                sublime.error_message("No models available")
+                return
             
             def on_done(index):
                 if index >= 0:
-                    settings.set('selected_model', models[index])
-                    sublime.save_settings('Ollama.sublime-settings')
+                    set_state('selected_model', models[index].name)
+                    preload_model(models[index].name)
             
-            sublime.active_window().show_quick_panel(models, on_done)
-        except Exception as e:
+            sublime.active_window().show_quick_panel(model_items(models), on_done)
+        
+        def on_error(e):
             sublime.error_message("Error fetching models: {0}".format(str(e)))
+        
+        fetch_models(on_models, on_error)
+
+class PromptPrefetch:
+    # Does the work of an Ask Any request while its prompt is typed: loads
+    # and ranks the context files against the text so far whenever typing
+    # pauses, so the request finds its bundle built, and has the server
+    # evaluate the prompt up to where the typed text will go
+    def __init__(self, view, conversation=None, chunked=None):
+        settings = get_settings()
+        self.view = view
+        self.model = settings.get('selected_model')
+        self.system_prompt = settings.get('systemPrompt', 'You are a helpful assistant.')
+        self.keep_alive = resolve_keep_alive(settings, self.model)
+        self.delay = settings.get('prefetch_delay_ms', 300)
+        self.active = bool(self.model) and settings.get('prefetch_context', True)
+        self.text = ''
+        self.url = None
+        self.generation = 0
+        self.prefilled = None
+        if not self.active:
+            return
+        
+        # The same context on_prompt_done will send
+        sel = view.sel()
+        if len(sel) and len(sel[0]) > 0:
+            self.context = view.substr(sel[0])
+        else:
+            self.context = view.substr(sublime.Region(0, view.size()))
+        
+        # Chat requests and chunked inputs are laid out differently
+        if conversation is None:
+            conversation = settings.get('conversation_mode', False)
+        if chunked is None:
+            chunked = settings.get('chunk_large_input', False)
+        self.warmup = settings.get('prefetch_warmup', True) and not conversation and not (
+            chunked and len(self.context) > settings.get('chunk_threshold_chars', 32000))
+        
+        preload_model(self.model, self.keep_alive)
+        self.schedule()
+    
+    def update(self, text):
+        self.text = text
+        self.schedule()
+    
+    def close(self):
+        self.active = False
+    
+    def schedule(self):
+        if not self.active:
+            return
+        self.generation += 1
+        generation = self.generation
+        sublime.set_timeout_async(lambda: self.run(generation), self.delay)
+    
+    def run(self, generation):
+        # Only the last change before a pause is prepared
+        if not self.active or generation != self.generation:
+            return
+        settings = get_settings()
+        context_paths = settings.get('context_paths', [])
+        prompt_parts = []
+        try:
+            if context_paths:
+                bundle = build_context(
+                    context_paths,
+                    settings.get('supported_extensions', []),
+                    settings.get('context_token_budget', 8192),
+                    self.text,
+                    self.context
+                )
+                if bundle.parts:
+                    prompt_parts.extend(bundle.parts)
+                    prompt_parts.append("\n\n")
+        except Exception as e:
+            print("Ollama Error: Could not prefetch context: {0}".format(str(e)))
+            return
+        
+        if not self.warmup or not self.active:
+            return
+        # Laid out like RequestThread.generate, minus the prompt itself
+        prompt_parts.extend([self.context, "\n\n"])
+        prefix_hash = text_hash(prompt_parts)
+        if prefix_hash == self.prefilled:
+            return
+        endpoint = EndpointPool.get_instance().choose(self.model, prefer=self.url)
+        if endpoint is None:
+            return
+        if ModelWarmer.get_instance().prefill(endpoint.url, self.model, self.system_prompt,
+                                              PromptText(prompt_parts), self.keep_alive):
+            self.prefilled = prefix_hash
+            self.url = endpoint.url
 
 class OllamaAskAnyCommand(sublime_plugin.TextCommand):
-    def run(self, edit, prompt=None):
+    def run(self, edit, prompt=None, bypass_cache=False, conversation=None, keep_alive=None,
+            chunked=None, reduce=False):
+        self.bypass_cache = bypass_cache
+        self.conversation = conversation
+        self.keep_alive = keep_alive
+        self.chunked = chunked
+        self.reduce = reduce
+        self.prefetch = None
         if not prompt:
+            # Prepare the context and the server while the prompt is typed
+            self.prefetch = PromptPrefetch(self.view, conversation, chunked)
             self.view.window().show_input_panel("Enter your prompt:", "", 
-                self.on_prompt_done, None, None)
+                self.on_prompt_done, self.prefetch.update, self.prefetch.close)
         else:
             self.on_prompt_done(prompt)
     
     def on_prompt_done(self, prompt):
+        prefetch = getattr(self, 'prefetch', None)
+        if prefetch:
+            prefetch.close()
         if prompt:
             # Get settings
-            settings = sublime.load_settings('Ollama.sublime-settings')
-            
-            # Get current history
-            history = settings.get('history', [])
-            
-            # Create new entry
-            new_entry = {
-                'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'prompt': prompt,
-                'model': settings.get('selected_model')
-            }
-            
-            # Remove any existing entries with the same prompt (case-insensitive)
-            history = [h for h in history if h['prompt'].lower() != prompt.lower()]
-            
-            # Add new entry at the beginning
-            history.insert(0, new_entry)
-            
-            # Keep only last 50 items
-            if len(history) > 50:
-                history = history[0:50]
-            
-            # Save updated history
-            settings.set('history', history)
-            sublime.save_settings('Ollama.sublime-settings')
+            settings = get_settings()
             
             # Continue with request...
             model = settings.get('selected_model')
+            
+            # Record the prompt; the response and timings are added when it completes
+            history_id = record_history(prompt, model)
+            
             if not model:
                 sublime.error_message("Please select a model first")
                 return
             
             system_prompt = settings.get('systemPrompt', 'You are a helpful assistant.')
-            url = settings.get('ollamaUrl', 'http://localhost:11434')
+            # No fixed server: each request goes to the best endpoint
+            url = None
+            
+            conversation = None
+            use_conversation = getattr(self, 'conversation', None)
+            if use_conversation is None:
+                use_conversation = settings.get('conversation_mode', False)
+            if use_conversation:
+                conversation = ConversationStore.get_instance().get(self.view.id(), model, system_prompt)
             
             sel = self.view.sel()
             if len(sel[0]) > 0:
@@ -164,20 +612,59 @@ class OllamaAskAnyCommand(sublime_plugin.TextCommand):
                 self.view.run_command('insert', {'characters': '\n\n'})
                 # Place cursor at the new position
                 self.view.sel().add(sublime.Region(insert_point + 2))
+            elif conversation and not conversation.is_empty():
+                # Follow-ups rely on the file content sent with the first turn
+                context = ''
             else:
                 context = self.view.substr(sublime.Region(0, self.view.size()))
             
-            thread = RequestThread(self.view, url, model, system_prompt, prompt, context)
-            thread.start()
+            use_cache = not getattr(self, 'bypass_cache', False)
+            keep_alive = resolve_keep_alive(settings, model, getattr(self, 'keep_alive', None))
+            
+            # Large inputs are split and processed chunk by chunk
+            chunked = getattr(self, 'chunked', None)
+            if chunked is None:
+                chunked = settings.get('chunk_large_input', False) and conversation is None
+            on_complete = None
+            if history_id is not None:
+                on_complete = lambda thread: record_history_result(history_id, thread)
+            
+            chunk_size = settings.get('chunk_size_chars', 12000)
+            if chunked and len(context) > settings.get('chunk_threshold_chars', 32000):
+                chunks = split_structural(context, chunk_size)
+                if len(chunks) > 1:
+                    ChunkedRequest(
+                        self.view, url, model, system_prompt, prompt, chunks,
+                        parallelism=settings.get('chunk_parallelism', 2),
+                        reduce=bool(getattr(self, 'reduce', False)),
+                        keep_alive=keep_alive,
+                        use_cache=use_cache,
+                        on_complete=on_complete
+                    ).start()
+                    return
+            
+            thread = RequestThread(self.view, url, model, system_prompt, prompt, context,
+                use_cache=use_cache, conversation=conversation, keep_alive=keep_alive,
+                on_complete=on_complete, prefer_url=prefetch.url if prefetch else None)
+            submit_request(thread)
 
 class OllamaUseTemplateCommand(sublime_plugin.TextCommand):
-    def run(self, edit):
-        settings = sublime.load_settings('Ollama.sublime-settings')
+    def run(self, edit, title=None):
+        settings = get_settings()
         templates = settings.get('templates', [])
         
         if not templates:
             sublime.error_message("No templates defined in settings")
             return
+        
+        if title is not None:
+            # Skip the picker when the template is given, e.g. by a search
+            for template in templates:
+                if template['title'] == title:
+                    self.use_template(template)
+                    return
+            sublime.error_message("Template not found: {0}".format(title))
+            return
             
         items = ["{0} - {1}".format(
             t['title'], 
@@ -186,26 +673,145 @@ class OllamaUseTemplateCommand(sublime_plugin.TextCommand):
         
         def on_done(index):
             if index >= 0:
-                self.template = templates[index]
-                model = self.template.get('model', settings.get('selected_model'))
-                if not model:
-                    sublime.error_message("No model selected or specified in template")
-                    return
-                    
-                settings.set('selected_model', model)
-                self.view.window().show_input_panel(
-                    "Edit prompt:", 
-                    self.template['prompt'],
-                    self.on_prompt_edited,
-                    None,
-                    None
-                )
+                self.use_template(templates[index])
         
         sublime.active_window().show_quick_panel(items, on_done)
     
+    def use_template(self, template):
+        settings = get_settings()
+        self.template = template
+        model = self.template.get('model', settings.get('selected_model'))
+        if not model:
+            sublime.error_message("No model selected or specified in template")
+            return
+            
+        set_state('selected_model', model)
+        
+        # Load the template model while the prompt is being edited
+        if 'model' in self.template:
+            preload_model(model, self.template.get('keep_alive'))
+        
+        self.view.window().show_input_panel(
+            "Edit prompt:", 
+            self.template['prompt'],
+            self.on_prompt_edited,
+            None,
+            None
+        )
+    
     def on_prompt_edited(self, edited_prompt):
         if edited_prompt:
-            self.view.run_command('ollama_ask_any', {'prompt': edited_prompt})
+            self.view.run_command('ollama_ask_any', {
+                'prompt': edited_prompt,
+                'keep_alive': self.template.get('keep_alive'),
+                'reduce': self.template.get('reduce', False)
+            })
+
+class OllamaBatchTemplateCommand(sublime_plugin.WindowCommand):
+    TARGETS = [
+        ["Selections", "Every selection in the current view"],
+        ["Open Views", "Every open view in this window"],
+        ["Files", "All files matching a path or glob"]
+    ]
+    OUTPUTS = [
+        ["Replace In Place", "Replace each selection, view or file with its result"],
+        ["New Views", "Open each result in a new view"],
+        ["Output Files", "Write each result next to its file"]
+    ]
+    
+    def run(self):
+        settings = get_settings()
+        self.templates = settings.get('templates', [])
+        
+        if not self.templates:
+            sublime.error_message("No templates defined in settings")
+            return
+        
+        items = ["{0} - {1}".format(
+            t['title'],
+            t['prompt'][:50] + "..." if len(t['prompt']) > 50 else t['prompt']
+        ) for t in self.templates]
+        
+        self.window.show_quick_panel(items, self.on_template_done)
+    
+    def on_template_done(self, index):
+        if index < 0:
+            return
+        settings = get_settings()
+        self.template = self.templates[index]
+        self.model = self.template.get('model', settings.get('selected_model'))
+        if not self.model:
+            sublime.error_message("No model selected or specified in template")
+            return
+        preload_model(self.model, self.template.get('keep_alive'))
+        self.window.show_quick_panel(self.TARGETS, self.on_target_done)
+    
+    def on_target_done(self, index):
+        if index < 0:
+            return
+        if index == 2:
+            view = self.window.active_view()
+            default_path = ""
+            if view and view.file_name():
+                default_path = os.path.dirname(view.file_name()) + os.sep + "**"
+            self.window.show_input_panel("Run template on files (supports wildcards):", default_path,
+                                         self.on_glob_done, None, None)
+            return
+        
+        # Selections and unsaved views are identified by their content, which
+        # unlike offsets and view ids stays the same across restarts
+        seen = {}
+        
+        def content_id(name, text):
+            item_id = "{0}:{1}".format(name, text_hash([text]))
+            seen[item_id] = seen.get(item_id, 0) + 1
+            return "{0}:{1}".format(item_id, seen[item_id])
+        
+        if index == 0:
+            view = self.window.active_view()
+            name = view.file_name() or view.name() or "untitled" if view else ""
+            self.items = [
+                BatchItem(content_id(name, view.substr(region)),
+                          "{0} ({1})".format(os.path.basename(name), i + 1), view=view, region=region, number=i + 1)
+                for i, region in enumerate(view.sel() if view else []) if not region.empty()
+            ]
+        else:
+            # The plugin's own output and scratch views are not input
+            self.items = [
+                BatchItem(view.file_name() or content_id("view", view.substr(sublime.Region(0, view.size()))),
+                          os.path.basename(view.file_name() or view.name() or "untitled"), view=view)
+                for view in self.window.views()
+                if view.size() and not view.is_scratch() and not view.is_read_only()
+            ]
+        self.choose_output()
+    
+    def on_glob_done(self, path):
+        settings = get_settings()
+        matcher = PathMatcher(
+            path,
+            settings.get('supported_extensions', []),
+            settings.get('context_ignored_dirs', DEFAULT_IGNORED_DIRS),
+            settings.get('context_use_ignore_files', True)
+        )
+        # Results written next to their files must not become batch input
+        suffix = settings.get('batch_output_suffix', '.ollama.md')
+        self.items = [
+            BatchItem(file_path, os.path.basename(file_path), path=file_path)
+            for file_path in matcher.files() if not file_path.endswith(suffix)
+        ]
+        self.choose_output()
+    
+    def choose_output(self):
+        if not self.items:
+            sublime.error_message("Nothing to run the template on")
+            return
+        self.window.show_quick_panel(self.OUTPUTS, self.on_output_done)
+    
+    def on_output_done(self, index):
+        if index < 0:
+            return
+        output_mode = [BatchJob.OUTPUT_REPLACE, BatchJob.OUTPUT_NEW_VIEW, BatchJob.OUTPUT_FILES][index]
+        BatchJob(self.window, self.template, self.model, self.items, output_mode).start()
 
 class OllamaAddTemplateCommand(sublime_plugin.ApplicationCommand):
     def run(self):
@@ -216,18 +822,20 @@ class OllamaAddTemplateCommand(sublime_plugin.ApplicationCommand):
     def on_title_done(self, title):
         self.title = title
         # Get available models
-        url = self.settings.get('ollamaUrl', 'http://localhost:11434')
-        try:
-            response = requests.get("{0}/api/tags".format(url))
-            self.models = [model['name'] for model in response.json()['models']]
-            self.models.insert(0, "Use Default Model")  # Add option to use default model
-            
-            # Show model selection
-            sublime.active_window().show_quick_panel(self.models, self.on_model_done)
-        except Exception as e:
-            print("Ollama Error: {0}".format(str(e)))
-            # Continue without model selection
-            self.on_prompt_input()
+        fetch_models(self.on_models, self.on_models_error)
+    
+    def on_models(self, models):
+        self.models = [model.name for model in models]
+        self.models.insert(0, "Use Default Model")  # Add option to use default model
+        
+        # Show model selection
+        sublime.active_window().show_quick_panel(
+            model_items(models, self.models[:1]), self.on_model_done)
+    
+    def on_models_error(self, e):
+        print("Ollama Error: {0}".format(str(e)))
+        # Continue without model selection
+        self.on_prompt_input()
     
     def on_model_done(self, index):
         if index > 0:  # If a specific model was selected
@@ -257,7 +865,7 @@ class OllamaAddTemplateCommand(sublime_plugin.ApplicationCommand):
         templates.append(template)
         
         self.settings.set('templates', templates)
-        sublime.save_settings('Ollama.sublime-settings')
+        SettingsWriter.save()
         sublime.status_message("Template added successfully")
 
 class OllamaRemoveTemplateCommand(sublime_plugin.ApplicationCommand):
@@ -279,7 +887,7 @@ class OllamaRemoveTemplateCommand(sublime_plugin.ApplicationCommand):
             if index >= 0:
                 templates.pop(index)
                 settings.set('templates', templates)
-                sublime.save_settings('Ollama.sublime-settings')
+                SettingsWriter.save()
                 sublime.status_message("Template removed successfully")
         
         sublime.active_window().show_quick_panel(items, on_done)
@@ -324,20 +932,24 @@ class OllamaEditTemplateCommand(sublime_plugin.ApplicationCommand):
             self.new_title = title
             
             # Get available models
-            url = self.settings.get('ollamaUrl', 'http://localhost:11434')
-            try:
-                response = requests.get("{0}/api/tags".format(url))
-                self.models = [model['name'] for model in response.json()['models']]
-                self.models.insert(0, "Use Default Model")
-                if self.template.get('model'):
-                    self.models.insert(1, "Keep Current Model ({0})".format(self.template['model']))
-                
-                # Show model selection
-                sublime.active_window().show_quick_panel(self.models, self.on_model_done)
-            except Exception as e:
-                print("Ollama Error: {0}".format(str(e)))
-                # Continue without model selection
-                self.on_prompt_input()
+            fetch_models(self.on_models, self.on_models_error)
+    
+    def on_models(self, models):
+        self.models = [model.name for model in models]
+        self.models.insert(0, "Use Default Model")
+        if self.template.get('model'):
+            self.models.insert(1, "Keep Current Model ({0})".format(self.template['model']))
+        
+        # Show model selection
+        extra_items = self.models[:len(self.models) - len(models)]
+        sublime.active_window().show_quick_panel(
+            model_items(models, extra_items), self.on_model_done)
+    
+    def on_models_error(self, e):
+        print("Ollama Error: {0}".format(str(e)))
+        # Continue without model selection
+        self.new_model = self.template.get('model')
+        self.on_prompt_input()
     
     def on_model_done(self, index):
         if index == 0:  # Use Default Model
@@ -364,68 +976,115 @@ class OllamaEditTemplateCommand(sublime_plugin.ApplicationCommand):
     
     def on_prompt_done(self, prompt):
         if prompt:
-            # Update template
-            new_template = {
-                "title": self.new_title,
-                "prompt": prompt
-            }
-            
-            # Add model if specified
+            # Update the edited fields, keeping the others (reduce, keep_alive)
+            new_template = dict(self.template)
+            new_template["title"] = self.new_title
+            new_template["prompt"] = prompt
             if self.new_model:
                 new_template["model"] = self.new_model
+            else:
+                new_template.pop("model", None)
             
             # Update template in list
             self.templates[self.selected_index] = new_template
             
             # Save updated templates
             self.settings.set('templates', self.templates)
-            sublime.save_settings('Ollama.sublime-settings')
+            SettingsWriter.save()
             sublime.status_message("Template updated successfully")
 
-class RequestManager:
-    _instance = None
-    _current_thread = None
-
-    @classmethod
-    def get_instance(cls):
-        if cls._instance is None:
-            cls._instance = cls()
-        return cls._instance
-    
-    def set_current_thread(self, thread):
-        self._current_thread = thread
-    
-    def cancel_current_request(self):
-        if self._current_thread and self._current_thread.is_alive():
-            self._current_thread.cancel()
-            return True
-        return False
-
 class OllamaCancelRequestCommand(sublime_plugin.ApplicationCommand):
     def run(self):
-        manager = RequestManager.get_instance()
-        if manager.cancel_current_request():
+        scheduler = RequestScheduler.get_instance()
+        
+        # Cancel the requests of the active view, or the latest one if it has none
+        view = sublime.active_window().active_view()
+        cancelled = scheduler.cancel_view(view.id()) if view else 0
+        if not cancelled:
+            jobs = scheduler.jobs()
+            if jobs and scheduler.cancel(jobs[-1].job_id):
+                cancelled = 1
+        
+        if cancelled:
             sublime.status_message("Ollama: Request cancelled")
         else:
             sublime.status_message("Ollama: No active request to cancel")
 
+class OllamaCancelAllRequestsCommand(sublime_plugin.ApplicationCommand):
+    def run(self):
+        cancelled = RequestScheduler.get_instance().cancel_all()
+        if cancelled:
+            sublime.status_message("Ollama: {0} requests cancelled".format(cancelled))
+        else:
+            sublime.status_message("Ollama: No active request to cancel")
+
+class OllamaShowRequestsCommand(sublime_plugin.ApplicationCommand):
+    def run(self):
+        scheduler = RequestScheduler.get_instance()
+        jobs = scheduler.jobs()
+        
+        if not jobs:
+            sublime.status_message("Ollama: No requests in flight")
+            return
+        
+        now = time.time()
+        items = []
+        for job in jobs:
+            if job.state == STATE_RUNNING:
+                details = "Running for {0:.0f}s".format(now - job.started_at)
+            else:
+                details = "Queued for {0:.0f}s".format(now - job.submitted_at)
+            items.append([job.label, "{0} - {1} (select to cancel)".format(details, job.model)])
+        
+        def on_done(index):
+            if index >= 0 and scheduler.cancel(jobs[index].job_id):
+                sublime.status_message("Ollama: Request cancelled")
+        
+        sublime.active_window().show_quick_panel(items, on_done)
+
 class RequestThread(threading.Thread):
-    def __init__(self, view, url, model, system_prompt, prompt, context):
+    def __init__(self, view, url, model, system_prompt, prompt, context, use_cache=True, conversation=None,
+                 keep_alive=None, output=None, on_complete=None, use_context_files=True, show_status=True,
+                 report_errors=True, prefer_url=None):
         threading.Thread.__init__(self)
         self.view = view
+        # A server to pin the request to; None lets the endpoint pool choose,
+        # going to prefer_url (which has the prompt prefilled) while it is up
         self.url = url
+        self.prefer_url = prefer_url
+        self.endpoint = None
         self.model = model
         self.system_prompt = system_prompt
         self.prompt = prompt
         self.context = context
+        self.use_cache = use_cache
+        self.conversation = conversation
+        self.keep_alive = keep_alive
+        # Where streamed text goes instead of the view, and a callback
+        # receiving the thread once it finished, failed or was cancelled
+        self.output = output
+        self.on_complete = on_complete
+        self.use_context_files = use_context_files
+        self.show_status = show_status
+        self.report_errors = report_errors
+        self.result = None
+        self.metrics = None
+        self.context_hash = None
+        self.completed = False
         self.cancelled = False
         self.response = None
-        
-        # Register as current thread
-        RequestManager.get_instance().set_current_thread(self)
+        # Batches over files may run without any view; they pass an output
+        self.view_id = view.id() if view is not None else None
+        self.label = prompt[:50] + "..." if len(prompt) > 50 else prompt
+        self._notified = False
+        self._notify_lock = threading.Lock()
 
     def cancel(self):
         self.cancelled = True
+        if getattr(self, 'state', None) == STATE_QUEUED:
+            # Queued jobs are dropped by the scheduler and never run
+            self.set_status()
+            self.notify_complete()
         if self.response:
             try:
                 self.response.close()
@@ -434,58 +1093,142 @@ class RequestThread(threading.Thread):
 
     def run(self):
         try:
-            sublime.set_timeout(
-                lambda: self.view.set_status('ollama', 'Ollama: Generating response with {0}... (Press Cmd/Ctrl+Shift+C to cancel)'.format(self.model)),
-                0
-            )
+            # Cancelled between leaving the queue and starting
+            if not self.cancelled:
+                self.generate()
+            else:
+                self.set_status()
+        finally:
+            self.notify_complete()
+
+    def notify_complete(self):
+        # on_complete runs once, whether the job ran or was dropped
+        with self._notify_lock:
+            if self._notified:
+                return
+            self._notified = True
+        if self.on_complete:
+            self.on_complete(self)
+
+    def set_status(self, text=None):
+        if not self.show_status or self.view is None:
+            return
+        if text:
+            sublime.set_timeout(lambda: self.view.set_status('ollama', text), 0)
+        else:
+            sublime.set_timeout(lambda: self.view.erase_status('ollama'), 0)
+
+    def generate(self):
+        try:
+            self.set_status('Ollama: Generating response with {0}... (Press Cmd/Ctrl+Shift+C to cancel)'.format(self.model))
             
-            print("Ollama: Making request to {0}".format(self.url))
             print("Ollama: Using model: {0}".format(self.model))
             
-            settings = sublime.load_settings('Ollama.sublime-settings')
+            settings = get_settings()
             context_paths = settings.get('context_paths', [])
             supported_extensions = settings.get('supported_extensions', [])
+            follow_up = self.conversation is not None and not self.conversation.is_empty()
 
-            # Get additional context from files
-            additional_context = get_context_files(context_paths, supported_extensions)
-            full_context = "{0}\n\n{1}".format(additional_context, self.context) if additional_context else self.context
+            # Get additional context from files, packed into the token budget.
+            # The prompt is kept as a list of parts referencing the cached file
+            # contents and is only joined where a plain string is needed
+            prompt_parts = []
+            if context_paths and self.use_context_files and not follow_up:
+                bundle = build_context(
+                    context_paths,
+                    supported_extensions,
+                    settings.get('context_token_budget', 8192),
+                    self.prompt,
+                    self.context
+                )
+                if bundle.parts:
+                    prompt_parts.extend(bundle.parts)
+                    prompt_parts.append("\n\n")
+                report_context(bundle)
+            if prompt_parts or self.context or not follow_up:
+                prompt_parts.extend([self.context, "\n\n"])
+            self.context_hash = text_hash(prompt_parts)
+            prompt_parts.append(self.prompt)
+            content = PromptText(prompt_parts)
 
+            render_buffer = self.output or RenderBuffer(
+                self.view,
+                settings.get('render_interval_ms', 40),
+                settings.get('render_max_chars', 2048)
+            )
+            if self.conversation is not None:
+                content = str(content)
+                path = "/api/chat"
+                payload = {
+                    "model": self.model,
+                    "messages": self.conversation.request_messages(content),
+                    "stream": True
+                }
+            else:
+                path = "/api/generate"
+                payload = {
+                    "model": self.model,
+                    "system": self.system_prompt,
+                    "prompt": content,
+                    "stream": True
+                }
+            if self.keep_alive is not None:
+                payload["keep_alive"] = self.keep_alive
+            
+            cache = None
+            if self.use_cache and settings.get('response_cache_enabled', False):
+                cache = configure_response_cache()
+                cache_key = request_key(payload)
+            
             try:
-                self.response = requests.post(
-                    "{0}/api/generate".format(self.url),
-                    json={
-                        "model": self.model,
-                        "system": self.system_prompt,
-                        "prompt": "{0}\n\n{1}".format(full_context, self.prompt),
-                        "stream": True
-                    },
-                    stream=True
-                )
+                if cache:
+                    cached = cache.get(cache_key)
+                    if cached is not None:
+                        print("Ollama: Replaying cached response")
+                        render_buffer.write(cached)
+                        self.result = cached
+                        self.completed = True
+                        if self.conversation is not None:
+                            self.conversation.record(content, cached)
+                        sublime.set_timeout(lambda: sublime.status_message("Ollama: Replayed cached response"), 0)
+                        return
+                
+                metrics = self.metrics = RequestMetrics(self.model, path)
+                self.response = self.open_stream(path, payload)
+                print("Ollama: Making request to {0}".format(metrics.endpoint))
 
-                for line in self.response.iter_lines():
+                parts = []
+                # Token lines only have their text pulled out; the final line is decoded fully
+                chunks = self.response.iter_content(chunk_size=settings.get('stream_read_bytes', READ_CHUNK_BYTES))
+                field = 'content' if self.conversation is not None else 'response'
+                for text, data in iter_tokens(chunks, field, settings.get('stream_fast_parse', True)):
                     if self.cancelled:
                         print("Ollama: Request cancelled by user")
-                        sublime.set_timeout(
-                            lambda: self.view.erase_status('ollama'),
-                            0
-                        )
+                        self.set_status()
                         return
-                        
-                    if line:
-                        data = json.loads(line.decode('utf-8'))
-                        if 'response' in data:
-                            def handle_response(response_text):
-                                panel = OllamaOutputPanel.get_instance()
-                                if panel.is_visible():
-                                    panel.write(response_text)
-                                else:
-                                    self.view.run_command('ollama_insert_text', {'text': response_text})
-                            
-                            sublime.set_timeout(
-                                lambda x=data['response']: handle_response(x),
-                                0
-                            )
+                    
+                    if text is not None:
+                        if text:
+                            metrics.token_received()
+                        parts.append(text)
+                        render_buffer.write(text)
+                    # Only complete generations are cached or kept in the conversation
+                    if data is not None and data.get('done'):
+                        self.result = ''.join(parts)
+                        self.completed = True
+                        metrics.finish(data)
+                        record_metrics(metrics)
+                        if cache:
+                            store_response(cache, cache_key, self.result, self.model)
+                        if self.conversation is not None:
+                            self.conversation.record(content, self.result)
             finally:
+                # Render whatever is left, also when cancelled
+                render_buffer.close()
+                
+                if self.endpoint:
+                    EndpointPool.get_instance().release(self.endpoint, self.metrics.ttft)
+                
                 if self.response:
                     try:
                         self.response.close()
@@ -493,46 +1236,806 @@ class RequestThread(threading.Thread):
                         pass
                 
                 # Always clear the status bar
-                sublime.set_timeout(
-                    lambda: self.view.erase_status('ollama'),
-                    0
-                )
+                self.set_status()
                 
         except Exception as e:
             if not self.cancelled:
                 print("Ollama Error: {0}".format(str(e)))
-                sublime.error_message("Error making request: {0}".format(str(e)))
+                if self.report_errors:
+                    sublime.error_message("Error making request: {0}".format(str(e)))
             # Clear status even on error
-            sublime.set_timeout(
-                lambda: self.view.erase_status('ollama'),
-                0
+            self.set_status()
+
+    def open_stream(self, path, payload):
+        kwargs = {
+            'data': JsonBody(payload),
+            'headers': {'Content-Type': 'application/json'},
+            'stream': True
+        }
+        if self.url:
+            self.metrics.endpoint = self.url + path
+            return OllamaClient.get_instance().post(self.metrics.endpoint, **kwargs)
+        
+        # Fails over to another server if the chosen one cannot be reached
+        self.endpoint, response = EndpointPool.get_instance().post(path, self.model, self.prefer_url, **kwargs)
+        self.metrics.endpoint = self.endpoint.url + path
+        return response
+
+class ChunkOutput:
+    # Output for one chunk of a ChunkedRequest
+    def __init__(self, request, index):
+        self.request = request
+        self.index = index
+    
+    def write(self, text):
+        self.request.chunk_text(self.index, text)
+    
+    def close(self):
+        pass
+
+class ChunkedRequest:
+    # Runs the prompt over each chunk of a large input with bounded
+    # parallelism. Results are rendered in chunk order as they stream, or
+    # combined by a final reduce request.
+    REDUCE_PROMPT = ("The text below consists of partial results, each produced by running "
+                     "this instruction on one part of a larger text: \"{0}\"\n"
+                     "Combine them into a single, coherent answer to the instruction "
+                     "for the whole text.")
+    
+    def __init__(self, view, url, model, system_prompt, prompt, chunks, parallelism=2, reduce=False,
+                 keep_alive=None, use_cache=True, on_complete=None):
+        settings = get_settings()
+        self.view = view
+        self.url = url
+        self.model = model
+        self.system_prompt = system_prompt
+        self.prompt = prompt
+        self.chunks = chunks
+        self.parallelism = max(1, parallelism)
+        self.reduce = reduce
+        self.keep_alive = keep_alive
+        self.use_cache = use_cache
+        self.render_buffer = RenderBuffer(
+            view,
+            settings.get('render_interval_ms', 40),
+            settings.get('render_max_chars', 2048)
+        )
+        self.results = [[] for _ in chunks]
+        self.done = [False] * len(chunks)
+        self.threads = []
+        self.next_index = 0
+        self.emit_index = 0
+        self.finished = 0
+        self.failed = False
+        # Called with the request once it is done, like RequestThread's
+        # on_complete; the fields below describe the outcome
+        self.on_complete = on_complete
+        self.completed = False
+        self.cancelled = False
+        self.result = None
+        self.metrics = None
+        self.context_hash = None
+        self._lock = threading.RLock()
+    
+    def start(self):
+        print("Ollama: Splitting input into {0} chunks".format(len(self.chunks)))
+        with self._lock:
+            for _ in range(min(self.parallelism, len(self.chunks))):
+                self._submit_next()
+        self._update_status()
+    
+    def chunk_text(self, index, text):
+        with self._lock:
+            self.results[index].append(text)
+            # Only the earliest unfinished chunk is rendered live
+            if not self.reduce and index == self.emit_index:
+                self.render_buffer.write(text)
+    
+    def _submit_next(self):
+        index = self.next_index
+        self.next_index += 1
+        thread = RequestThread(
+            self.view, self.url, self.model, self.system_prompt, self.prompt, self.chunks[index],
+            use_cache=self.use_cache, keep_alive=self.keep_alive, output=ChunkOutput(self, index),
+            on_complete=lambda thread, index=index: self._on_chunk_complete(index, thread),
+            use_context_files=False, show_status=False
+        )
+        thread.label = "[{0}/{1}] {2}".format(index + 1, len(self.chunks), thread.label)
+        self.threads.append(thread)
+        submit_request(thread)
+    
+    def _on_chunk_complete(self, index, thread):
+        with self._lock:
+            if self.failed:
+                return
+            if not thread.completed:
+                # A failed or cancelled chunk cancels the whole request
+                self.failed = True
+                self.cancelled = thread.cancelled
+                for other in self.threads:
+                    if other is not thread:
+                        RequestScheduler.get_instance().cancel(other.job_id)
+                self.render_buffer.close()
+                self._update_status(done=True)
+                self._complete()
+                return
+            
+            self.done[index] = True
+            self.finished += 1
+            if not self.reduce:
+                self._advance()
+            if self.next_index < len(self.chunks):
+                self._submit_next()
+            all_done = self.finished == len(self.chunks)
+        
+        if not all_done:
+            self._update_status()
+        elif self.reduce:
+            self._start_reduce()
+        else:
+            self.render_buffer.close()
+            self._update_status(done=True)
+            self.completed = True
+            self.result = "\n\n".join(''.join(parts) for parts in self.results)
+            self._complete()
+    
+    def _complete(self):
+        if self.on_complete:
+            self.on_complete(self)
+    
+    def _on_reduce_complete(self, thread):
+        self.completed = thread.completed
+        self.cancelled = thread.cancelled
+        self.result = thread.result
+        self.metrics = thread.metrics
+        self.context_hash = thread.context_hash
+        self._complete()
+    
+    def _advance(self):
+        # Move past finished chunks and render the text of the next one
+        # that was collected while it waited for its turn
+        while self.emit_index < len(self.chunks) and self.done[self.emit_index]:
+            self.emit_index += 1
+            if self.emit_index < len(self.chunks):
+                self.render_buffer.write("\n\n")
+                self.render_buffer.write(''.join(self.results[self.emit_index]))
+    
+    def _start_reduce(self):
+        # The context files are sent once, with the step that sees every result
+        partial_results = "\n\n---\n\n".join(''.join(parts) for parts in self.results)
+        thread = RequestThread(
+            self.view, self.url, self.model, self.system_prompt,
+            self.REDUCE_PROMPT.format(self.prompt), partial_results,
+            use_cache=self.use_cache, keep_alive=self.keep_alive, output=self.render_buffer,
+            on_complete=self._on_reduce_complete
+        )
+        thread.label = "[reduce] {0}".format(thread.label)
+        submit_request(thread)
+    
+    def _update_status(self, done=False):
+        if done:
+            text = None
+        else:
+            text = "Ollama: Processed {0} of {1} chunks with {2}...".format(
+                self.finished, len(self.chunks), self.model)
+        
+        def update():
+            if text:
+                self.view.set_status('ollama', text)
+            else:
+                self.view.erase_status('ollama')
+        
+        sublime.set_timeout(update, 0)
+
+class DiscardOutput:
+    # Output for requests whose result is only used once complete
+    def write(self, text):
+        pass
+    
+    def close(self):
+        pass
+
+class BatchItem:
+    def __init__(self, item_id, label, view=None, region=None, path=None, number=None):
+        self.item_id = item_id
+        self.label = label
+        self.view = view
+        self.region = region
+        self.path = path
+        # Position of a selection among the view's selections
+        self.number = number
+        self.region_key = None
+    
+    def output_path(self, suffix):
+        path = self.path or self.view.file_name()
+        if not path:
+            return None
+        # Selections of the same file each get an output file of their own
+        if self.number is not None:
+            return "{0}.{1}{2}".format(path, self.number, suffix)
+        return path + suffix
+    
+    def text(self):
+        if self.path:
+            return ContextIndex.get_instance().read(self.path)
+        if self.region is not None:
+            return self.view.substr(self.view.get_regions(self.region_key)[0])
+        return self.view.substr(sublime.Region(0, self.view.size()))
+
+class BatchJob:
+    # Runs a template over many items through the request scheduler, with a
+    # JSONL log of finished items so an interrupted batch can be resumed
+    OUTPUT_REPLACE = 'replace'
+    OUTPUT_NEW_VIEW = 'new_view'
+    OUTPUT_FILES = 'files'
+    
+    def __init__(self, window, template, model, items, output_mode):
+        settings = get_settings()
+        self.window = window
+        self.template = template
+        self.model = model
+        self.items = items
+        self.output_mode = output_mode
+        self.system_prompt = settings.get('systemPrompt', 'You are a helpful assistant.')
+        self.keep_alive = resolve_keep_alive(settings, model, template.get('keep_alive'))
+        self.parallelism = max(1, settings.get('batch_parallelism', 2))
+        self.output_suffix = settings.get('batch_output_suffix', '.ollama.md')
+        self.log_path = os.path.join(sublime.cache_path(), 'Ollama', 'batches', self.key() + '.jsonl')
+        self.pending = []
+        self.threads = []
+        self.done = 0
+        self.failed = 0
+        self.running = 0
+        self.stopped = False
+        self._lock = threading.RLock()
+    
+    def key(self):
+        data = json.dumps([self.template.get('prompt'), self.model, self.output_mode,
+                           [item.item_id for item in self.items]])
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+    
+    def finished_items(self):
+        finished = set()
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('status') == 'done':
+                        finished.add(entry['item_id'])
+        except OSError:
+            pass
+        return finished
+    
+    def log(self, item, status):
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'item_id': item.item_id, 'status': status, 'time': time.time()}) + "\n")
+        except OSError as e:
+            print("Ollama Error: Could not write batch log: {0}".format(str(e)))
+    
+    def start(self):
+        finished = self.finished_items()
+        self.pending = [item for item in self.items if item.item_id not in finished]
+        skipped = len(self.items) - len(self.pending)
+        if skipped:
+            print("Ollama: Resuming batch, {0} of {1} items already done".format(skipped, len(self.items)))
+        self.done = skipped
+        
+        # Track selections with regions so in-place edits don't shift them
+        for i, item in enumerate(self.pending):
+            if item.region is not None:
+                item.region_key = 'ollama_batch_{0}_{1}'.format(self.key(), i)
+                item.view.add_regions(item.region_key, [item.region], '', '', sublime.HIDDEN)
+        
+        if not self.pending:
+            self.finish()
+            return
+        
+        with self._lock:
+            for _ in range(min(self.parallelism, len(self.pending))):
+                if self.pending:
+                    self._submit_next()
+            finished = self.running == 0
+        if finished:
+            self.finish()
+        else:
+            self.update_status()
+    
+    def _submit_next(self):
+        item = self.pending.pop(0)
+        try:
+            text = item.text()
+        except Exception as e:
+            text = None
+            print("Ollama Error: Could not read {0}: {1}".format(item.label, str(e)))
+        if text is None:
+            self.failed += 1
+            self.log(item, 'skipped')
+            if self.pending:
+                self._submit_next()
+            return
+        
+        # Files are read from disk; the active view, if any, only groups
+        # the request with the view's other requests
+        view = item.view or self.window.active_view()
+        thread = RequestThread(
+            view, None, self.model, self.system_prompt, self.template['prompt'], text,
+            keep_alive=self.keep_alive, output=DiscardOutput(),
+            on_complete=lambda thread, item=item: self._on_item_complete(item, thread),
+            use_context_files=False, show_status=False, report_errors=False
+        )
+        thread.label = "[batch] {0}".format(item.label)
+        self.threads.append(thread)
+        self.running += 1
+        submit_request(thread, PRIORITY_BATCH)
+    
+    def _on_item_complete(self, item, thread):
+        with self._lock:
+            self.running -= 1
+            if thread.cancelled:
+                # Cancelling any item stops the batch; the log keeps what is done
+                self.stopped = True
+            elif thread.completed:
+                self.done += 1
+            else:
+                self.failed += 1
+                self.log(item, 'failed')
+            
+            if not self.stopped and self.pending:
+                self._submit_next()
+            finished = self.running == 0 and (self.stopped or not self.pending)
+        
+        if thread.completed and not thread.cancelled:
+            sublime.set_timeout(lambda: self.write_result(item, thread.result), 0)
+        if finished:
+            sublime.set_timeout(self.finish, 0)
+        else:
+            self.update_status()
+    
+    def write_result(self, item, result):
+        try:
+            if self.output_mode == self.OUTPUT_FILES and item.output_path(self.output_suffix):
+                write_file(item.output_path(self.output_suffix), result)
+            elif self.output_mode == self.OUTPUT_REPLACE and item.path:
+                write_file(item.path, result)
+            elif self.output_mode == self.OUTPUT_REPLACE:
+                if item.region_key:
+                    region = item.view.get_regions(item.region_key)[0]
+                    item.view.erase_regions(item.region_key)
+                else:
+                    region = sublime.Region(0, item.view.size())
+                item.view.run_command('ollama_replace_text', {'begin': region.begin(), 'end': region.end(), 'text': result})
+            else:
+                view = self.window.new_file()
+                view.set_name("{0} - {1}".format(self.template['title'], item.label))
+                view.set_scratch(True)
+                view.run_command('append', {'characters': result})
+            self.log(item, 'done')
+        except Exception as e:
+            print("Ollama Error: Could not write result for {0}: {1}".format(item.label, str(e)))
+            self.log(item, 'failed')
+    
+    def update_status(self):
+        text = "Ollama batch: {0} of {1} done{2} ({3})".format(
+            self.done, len(self.items),
+            ", {0} failed".format(self.failed) if self.failed else "",
+            self.template['title'])
+        sublime.set_timeout(lambda: sublime.status_message(text), 0)
+    
+    def finish(self):
+        if self.stopped:
+            sublime.status_message("Ollama batch cancelled: {0} of {1} done, run it again to resume".format(
+                self.done, len(self.items)))
+            return
+        sublime.status_message("Ollama batch finished: {0} of {1} done{2}".format(
+            self.done, len(self.items), ", {0} failed".format(self.failed) if self.failed else ""))
+        if not self.failed:
+            try:
+                os.remove(self.log_path)
+            except OSError:
+                pass
+
+def write_file(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+class OllamaReplaceTextCommand(sublime_plugin.TextCommand):
+    def run(self, edit, begin, end, text):
+        self.view.replace(edit, sublime.Region(begin, end), text)
+
+class RenderBuffer:
+    # Collects streamed text and renders it in one edit per flush interval.
+    # Flushes only pass the buffer id, so consecutive flushes are identical
+    # commands and Sublime merges them into a single undo step.
+    _buffers = {}
+    _next_id = 0
+    _registry_lock = threading.Lock()
+    
+    @classmethod
+    def take_text(cls, buffer_id):
+        render_buffer = cls._buffers.get(buffer_id)
+        return render_buffer.take() if render_buffer else ''
+    
+    def __init__(self, view, interval_ms=40, max_chars=2048):
+        self.view = view
+        self.interval_ms = interval_ms
+        self.max_chars = max_chars
+        self._parts = []
+        self._size = 0
+        self._scheduled = False
+        self._urgent = False
+        self._lock = threading.Lock()
+        
+        with RenderBuffer._registry_lock:
+            self.id = RenderBuffer._next_id
+            RenderBuffer._next_id += 1
+            RenderBuffer._buffers[self.id] = self
+    
+    def write(self, text):
+        with self._lock:
+            self._parts.append(text)
+            self._size += len(text)
+            # A full buffer is flushed right away, once
+            full = self._size >= self.max_chars and not self._urgent
+            schedule = not self._scheduled
+            self._scheduled = True
+            self._urgent = self._urgent or full
+        
+        if full:
+            sublime.set_timeout(self.flush, 0)
+        elif schedule:
+            sublime.set_timeout(self.flush, self.interval_ms)
+    
+    def take(self):
+        with self._lock:
+            text = ''.join(self._parts)
+            self._parts = []
+            self._size = 0
+            return text
+    
+    def flush(self):
+        with self._lock:
+            self._scheduled = False
+            self._urgent = False
+            if not self._parts:
+                return
+        
+        panel = OllamaOutputPanel.get_instance()
+        if panel.is_visible():
+            panel.write(self.take())
+        else:
+            self.view.run_command('ollama_insert_text', {'buffer_id': self.id})
+    
+    def close(self):
+        def final_flush():
+            self.flush()
+            with RenderBuffer._registry_lock:
+                RenderBuffer._buffers.pop(self.id, None)
+        
+        sublime.set_timeout(final_flush, 0)
+
+def configure_completion_cache():
+    settings = get_settings()
+    cache = CompletionCache.get_instance()
+    cache.configure(settings.get('inline_cache_size', 64))
+    return cache
+
+def single_caret(view):
+    sel = view.sel()
+    if len(sel) != 1 or not sel[0].empty():
+        return None
+    return sel[0].b
+
+def suggestion_html(text):
+    text = html.escape(text).replace('\t', '    ').replace(' ', '&nbsp;').replace('\n', '<br>')
+    return '<span style="color: color(var(--foreground) alpha(0.45));">{0}</span>'.format(text)
+
+class InlineCompletion:
+    # Suggests text at the caret when typing pauses, from a fill-in-the-middle
+    # request on the text around it. Every change cancels the request in
+    # flight; the suggestion is shown as a phantom and inserted with Tab
+    TYPING_COMMANDS = ('insert', 'insert_snippet', 'left_delete', 'right_delete')
+    sessions = {}
+    
+    @classmethod
+    def for_view(cls, view):
+        session = cls.sessions.get(view.id())
+        if session is None:
+            session = cls.sessions[view.id()] = cls(view)
+        return session
+    
+    @classmethod
+    def discard(cls, view_id):
+        session = cls.sessions.pop(view_id, None)
+        if session is not None:
+            session.cancel()
+    
+    @classmethod
+    def discard_all(cls):
+        for view_id in list(cls.sessions):
+            cls.discard(view_id)
+    
+    def __init__(self, view):
+        self.view = view
+        self.phantoms = sublime.PhantomSet(view, 'ollama_inline')
+        # Bumped on every change; requests and timers of older ones do nothing
+        self.generation = 0
+        self.request = None
+        # The suggestion on display, and the generation that showed it
+        self.point = None
+        self.text = ''
+        self.change_count = None
+        self.shown = None
+    
+    def is_visible(self):
+        return bool(self.text) and single_caret(self.view) == self.point
+    
+    def changed(self):
+        settings = get_settings()
+        generation = self.cancel(hide=False)
+        # Typing what the suggestion starts with keeps the rest on display
+        sublime.set_timeout(lambda: self.follow(generation), 0)
+        
+        if single_caret(self.view) is None or RequestScheduler.get_instance().jobs(self.view.id()):
+            return
+        command = self.view.command_history(0, True)[0]
+        if command not in self.TYPING_COMMANDS:
+            return
+        sublime.set_timeout_async(lambda: self.start(generation), settings.get('inline_debounce_ms', 250))
+    
+    def moved(self):
+        # The caret left the suggestion without an edit
+        if self.text and self.view.change_count() == self.change_count and single_caret(self.view) != self.point:
+            self.cancel()
+    
+    def cancel(self, hide=True):
+        self.generation += 1
+        if self.request is not None:
+            self.request.cancel()
+            self.request = None
+        if hide:
+            sublime.set_timeout(self.hide, 0)
+        return self.generation
+    
+    def follow(self, generation):
+        point = single_caret(self.view)
+        if self.text and point is not None and self.point is not None and point > self.point:
+            typed = self.view.substr(sublime.Region(self.point, point))
+            if len(typed) < len(self.text) and self.text.startswith(typed):
+                self.show(generation, point, self.text[len(typed):], self.view.change_count())
+                return
+        self.hide()
+    
+    def start(self, generation):
+        # Runs once typing paused for the debounce delay
+        if generation != self.generation or self.shown == generation:
+            return
+        settings = get_settings()
+        model = settings.get('inline_completion_model') or settings.get('selected_model')
+        point = single_caret(self.view)
+        if not model or point is None:
+            return
+        change_count = self.view.change_count()
+        prefix = self.view.substr(sublime.Region(max(0, point - settings.get('inline_prefix_chars', 2000)), point))
+        suffix = self.view.substr(sublime.Region(point, min(self.view.size(), point + settings.get('inline_suffix_chars', 1000))))
+        if not prefix.strip():
+            return
+        
+        cached = configure_completion_cache().get(model, prefix, suffix)
+        if cached is not None:
+            sublime.set_timeout(lambda: self.show(generation, point, cached, change_count), 0)
+            return
+        self.request = InlineCompletionRequest(self, generation, model, point, prefix, suffix, change_count)
+        self.request.start()
+    
+    def show(self, generation, point, text, change_count):
+        if (generation != self.generation or not text or single_caret(self.view) != point
+                or self.view.change_count() != change_count):
+            return
+        self.point = point
+        self.text = text
+        self.change_count = change_count
+        self.shown = generation
+        # The first line continues the caret's line, the others go below it
+        first, newline, rest = text.partition('\n')
+        phantoms = []
+        if first:
+            phantoms.append(sublime.Phantom(sublime.Region(point), suggestion_html(first), sublime.LAYOUT_INLINE))
+        if newline and rest:
+            phantoms.append(sublime.Phantom(sublime.Region(point), suggestion_html(rest), sublime.LAYOUT_BELOW))
+        self.phantoms.update(phantoms)
+    
+    def hide(self):
+        if self.text:
+            self.point = None
+            self.text = ''
+            self.phantoms.update([])
+    
+    def take(self):
+        if not self.is_visible():
+            return None, ''
+        point, text = self.point, self.text
+        self.cancel(hide=False)
+        self.hide()
+        return point, text
+
+class InlineCompletionRequest(threading.Thread):
+    def __init__(self, session, generation, model, point, prefix, suffix, change_count):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.session = session
+        self.generation = generation
+        self.model = model
+        self.point = point
+        self.prefix = prefix
+        self.suffix = suffix
+        self.change_count = change_count
+        self.cancelled = False
+        self.response = None
+    
+    def cancel(self):
+        self.cancelled = True
+        response = self.response
+        if response is not None:
+            try:
+                response.close()
+            except:
+                pass  # Ignore any errors during close
+    
+    def update(self, text):
+        sublime.set_timeout(lambda: self.session.show(self.generation, self.point, text, self.change_count), 0)
+    
+    def run(self):
+        settings = get_settings()
+        pool = EndpointPool.get_instance()
+        payload = completion_payload(self.model, self.prefix, self.suffix, settings.get('inline_max_tokens', 64),
+                                     resolve_keep_alive(settings, self.model))
+        metrics = RequestMetrics(self.model, '/api/generate', 'inline')
+        interval = settings.get('render_interval_ms', 40) / 1000.0
+        endpoint = None
+        try:
+            # Goes over the shared session's kept-alive connections
+            endpoint, self.response = pool.post(
+                '/api/generate',
+                self.model,
+                data=JsonBody(payload),
+                headers={'Content-Type': 'application/json'},
+                stream=True
             )
+            metrics.endpoint = endpoint.url + '/api/generate'
+            parts = []
+            shown_at = 0
+            chunks = self.response.iter_content(chunk_size=settings.get('stream_read_bytes', READ_CHUNK_BYTES))
+            for text, data in iter_tokens(chunks, 'response', settings.get('stream_fast_parse', True)):
+                if self.cancelled:
+                    return
+                if text:
+                    metrics.token_received()
+                    parts.append(text)
+                    # Show the suggestion as it grows, at most once per render interval
+                    if time.time() - shown_at >= interval:
+                        shown_at = time.time()
+                        self.update(''.join(parts))
+                if data is not None:
+                    if 'error' in data:
+                        raise ValueError(data['error'])
+                    if data.get('done'):
+                        completion = ''.join(parts)
+                        metrics.finish(data)
+                        configure_completion_cache().put(self.model, self.prefix, self.suffix, completion)
+                        self.update(completion)
+                        record_metrics(metrics, quiet=True)
+        except Exception as e:
+            if not self.cancelled:
+                print("Ollama Error: Inline completion failed: {0}".format(str(e)))
+        finally:
+            if endpoint is not None:
+                pool.release(endpoint, metrics.ttft)
+            if self.response is not None:
+                try:
+                    self.response.close()
+                except:
+                    pass
+
+class OllamaInlineCompletionListener(sublime_plugin.EventListener):
+    def on_modified_async(self, view):
+        settings = get_settings()
+        if settings.get('inline_completion', False) and not view.settings().get('is_widget') and not view.is_read_only():
+            InlineCompletion.for_view(view).changed()
+        elif view.id() in InlineCompletion.sessions:
+            InlineCompletion.discard(view.id())
+    
+    def on_selection_modified_async(self, view):
+        session = InlineCompletion.sessions.get(view.id())
+        if session is not None:
+            session.moved()
+    
+    def on_deactivated_async(self, view):
+        session = InlineCompletion.sessions.get(view.id())
+        if session is not None:
+            session.cancel()
+    
+    def on_close(self, view):
+        InlineCompletion.discard(view.id())
+    
+    def on_query_context(self, view, key, operator, operand, match_all):
+        if key != 'ollama_inline_suggestion':
+            return None
+        session = InlineCompletion.sessions.get(view.id())
+        visible = session is not None and session.is_visible()
+        if operator == sublime.OP_EQUAL:
+            return visible == operand
+        if operator == sublime.OP_NOT_EQUAL:
+            return visible != operand
+        return None
+
+class OllamaAcceptCompletionCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        session = InlineCompletion.sessions.get(self.view.id())
+        if session is None:
+            return
+        point, text = session.take()
+        if text:
+            self.view.insert(edit, point, text)
+
+class OllamaDismissCompletionCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        session = InlineCompletion.sessions.get(self.view.id())
+        if session is not None:
+            session.cancel()
+
+class OllamaToggleInlineCompletionCommand(sublime_plugin.ApplicationCommand):
+    def run(self):
+        enabled = not get_settings().get('inline_completion', False)
+        set_state('inline_completion', enabled)
+        if not enabled:
+            InlineCompletion.discard_all()
+        sublime.status_message("Ollama: Inline completion {0}".format("enabled" if enabled else "disabled"))
+    
+    def is_checked(self):
+        return bool(get_settings().get('inline_completion', False))
+
+class OllamaNewConversationCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        if ConversationStore.get_instance().reset(self.view.id()):
+            sublime.status_message("Ollama: Started a new conversation")
+        else:
+            sublime.status_message("Ollama: No conversation in this view")
+
+class OllamaConversationListener(sublime_plugin.EventListener):
+    def on_close(self, view):
+        ConversationStore.get_instance().reset(view.id())
 
 class OllamaInsertTextCommand(sublime_plugin.TextCommand):
-    def run(self, edit, text):
+    def run(self, edit, text=None, buffer_id=None):
+        if buffer_id is not None:
+            text = RenderBuffer.take_text(buffer_id)
+        if not text:
+            return
         sel = self.view.sel()
         if sel:
             self.view.insert(edit, sel[0].begin(), text)
 
 class OllamaShowHistoryCommand(sublime_plugin.TextCommand):
-    def run(self, edit):
-        settings = sublime.load_settings('Ollama.sublime-settings')
-        history = settings.get('history', [])
+    def run(self, edit, current_model=False):
+        settings = get_settings()
+        model = settings.get('selected_model') if current_model else None
+        # Newest first, one entry per prompt
+        history = configure_history().entries(model=model, limit=settings.get('history_show_entries', 500))
         
         if not history:
             sublime.error_message("No history available")
             return
         
-        # Sort history by timestamp (newest first)
-        history = sorted(
-            history,
-            key=lambda x: datetime.datetime.strptime(x['timestamp'], '%Y-%m-%d %H:%M:%S'),
-            reverse=True
-        )
-        
         # Create list items with preview and timestamp
         items = ["{0} - {1}".format(
-            h['timestamp'],
+            format_timestamp(h['timestamp']),
             h['prompt'][:50] + "..." if len(h['prompt']) > 50 else h['prompt']
         ) for h in history]
         
@@ -552,11 +2055,93 @@ class OllamaShowHistoryCommand(sublime_plugin.TextCommand):
         
         sublime.active_window().show_quick_panel(items, on_done)
 
+class OllamaSearchPromptsCommand(sublime_plugin.WindowCommand):
+    # Search-as-you-type over history and templates: matches are listed in an
+    # output panel while typing, Enter picks one of the ranked matches
+    PANEL = 'ollama_search'
+    
+    def run(self):
+        self.target = self.window.active_view()
+        self.results_view = self.window.create_output_panel(self.PANEL)
+        results_settings = self.results_view.settings()
+        results_settings.set('line_numbers', False)
+        results_settings.set('gutter', False)
+        results_settings.set('word_wrap', False)
+        self.window.run_command('show_panel', {'panel': 'output.' + self.PANEL})
+        sublime.set_timeout_async(prepare_prompt_search, 0)
+        self.window.show_input_panel("Search prompts and templates:", "",
+                                     self.on_done, self.on_change, self.close_results)
+    
+    def describe(self, match):
+        kind, item = match
+        prompt = item['prompt'].replace("\n", " ")
+        prompt = prompt[:80] + "..." if len(prompt) > 80 else prompt
+        if kind == 'template':
+            return "[template] {0} - {1}".format(item['title'], prompt)
+        return "{0} - {1}{2}".format(
+            format_timestamp(item['timestamp']), prompt,
+            " ({0})".format(item['model']) if item.get('model') else "")
+    
+    def on_change(self, query):
+        if self.results_view is None or not self.results_view.is_valid():
+            return
+        settings = get_settings()
+        matches = search_prompts(query, settings.get('search_preview_results', 20))
+        text = "\n".join(self.describe(match) for match in matches) or "No matches"
+        self.results_view.run_command('ollama_replace_text', {
+            'begin': 0, 'end': self.results_view.size(), 'text': text
+        })
+    
+    def close_results(self):
+        if self.results_view is not None:
+            self.window.destroy_output_panel(self.PANEL)
+        self.results_view = None
+    
+    def on_done(self, query):
+        self.close_results()
+        self.matches = search_prompts(query, 200)
+        if not self.matches:
+            sublime.status_message("Ollama: No prompts or templates match '{0}'".format(query))
+            return
+        self.window.show_quick_panel([self.describe(match) for match in self.matches], self.on_select)
+    
+    def on_select(self, index):
+        if index < 0:
+            return
+        kind, item = self.matches[index]
+        view = self.target if self.target and self.target.is_valid() else self.window.active_view()
+        if kind == 'template':
+            view.run_command('ollama_use_template', {'title': item['title']})
+        else:
+            self.window.show_input_panel(
+                "Edit prompt:",
+                item['prompt'],
+                lambda prompt: view.run_command('ollama_ask_any', {'prompt': prompt}),
+                None,
+                None
+            )
+
+class OllamaClearResponseCacheCommand(sublime_plugin.ApplicationCommand):
+    def run(self):
+        configure_response_cache().clear()
+        sublime.status_message("Ollama: Response cache cleared")
+
+class OllamaShowMetricsCommand(sublime_plugin.WindowCommand):
+    def run(self):
+        summary = configure_metrics_log().summarize()
+        if not summary:
+            sublime.status_message("Ollama: No metrics recorded yet")
+            return
+        
+        view = self.window.new_file()
+        view.set_name('Ollama Metrics')
+        view.set_scratch(True)
+        view.run_command('append', {'characters': format_summary(summary) + "\n"})
+        view.set_read_only(True)
+
 class OllamaClearHistoryCommand(sublime_plugin.ApplicationCommand):
     def run(self):
-        settings = sublime.load_settings('Ollama.sublime-settings')
-        settings.set('history', [])
-        sublime.save_settings('Ollama.sublime-settings')
+        configure_history().clear()
         sublime.status_message("Ollama: History cleared")
 
 class OllamaAddContextCommand(sublime_plugin.WindowCommand):
@@ -576,52 +2161,111 @@ class OllamaAddContextCommand(sublime_plugin.WindowCommand):
         )
     
     def on_done(self, path):
-        settings = sublime.load_settings('Ollama.sublime-settings')
-        supported_extensions = settings.get('supported_extensions', [])
-        context_paths = settings.get('context_paths', [])
+        context_paths = get_settings().get('context_paths', [])
         
         # Add new path
         if path and path not in context_paths:
-            context_paths.append(path)
-            settings.set('context_paths', context_paths)
-            sublime.save_settings('Ollama.sublime-settings')
-            
-            # Calculate stats
-            file_count = 0
-            total_size = 0
+            set_state('context_paths', context_paths + [path])
             
-            try:
-                if '**' in path:
-                    base_path = path.split('**')[0]
-                    pattern = path.split('**')[1]
-                    for root, _, files in os.walk(base_path):
-                        for file in files:
-                            if any(file.endswith('.' + ext) for ext in supported_extensions):
-                                file_path = os.path.join(root, file)
-                                if fnmatch.fnmatch(file_path, path):
-                                    file_count += 1
-                                    total_size += os.path.getsize(file_path)
-                else:
-                    if os.path.isfile(path):
-                        if any(path.endswith('.' + ext) for ext in supported_extensions):
-                            file_count = 1
-                            total_size = os.path.getsize(path)
-                    elif os.path.isdir(path):
-                        for file in os.listdir(path):
-                            if any(file.endswith('.' + ext) for ext in supported_extensions):
-                                file_path = os.path.join(path, file)
-                                if os.path.isfile(file_path):
-                                    file_count += 1
-                                    total_size += os.path.getsize(file_path)
-                
-                size_kb = total_size / 1024
-                sublime.status_message("Context added: {0} files ({1:.1f} kb)".format(file_count, size_kb))
-            except Exception as e:
-                sublime.error_message("Error processing path: {0}".format(str(e)))
+            # Counting the files can take a while on large trees
+            ContextScan.start(path)
+
+class ContextScan:
+    # Walks a newly added context path in the background with progress in
+    # the status bar, reports what it would send, and leaves the walk in the
+    # context index so the first request does not repeat it
+    LARGEST_FILES = 5
+    scans = {}
+    
+    def __init__(self, path):
+        settings = get_settings()
+        self.path = path
+        self.supported_extensions = settings.get('supported_extensions', [])
+        self.max_file_bytes = settings.get('context_max_file_kb', 512) * 1024
+        self.cancelled = False
+        self.file_count = 0
+        self.total_size = 0
+        self.sent_size = 0
+        # Min-heap of (size, path)
+        self.largest = []
+        self.reported_at = 0
+    
+    @classmethod
+    def start(cls, path):
+        cls.cancel(path)
+        scan = cls.scans[path] = cls(path)
+        thread = threading.Thread(target=scan.run)
+        thread.daemon = True
+        thread.start()
+    
+    @classmethod
+    def cancel(cls, path=None):
+        paths = [path] if path is not None else list(cls.scans)
+        cancelled = 0
+        for path in paths:
+            scan = cls.scans.pop(path, None)
+            if scan is not None:
+                scan.cancelled = True
+                cancelled += 1
+        return cancelled
+    
+    def on_file(self, file_path, size):
+        if self.cancelled:
+            return False
+        self.file_count += 1
+        self.total_size += size
+        if size <= self.max_file_bytes:
+            self.sent_size += size
+        if len(self.largest) < self.LARGEST_FILES:
+            heapq.heappush(self.largest, (size, file_path))
+        elif size > self.largest[0][0]:
+            heapq.heapreplace(self.largest, (size, file_path))
+        
+        now = time.time()
+        if now - self.reported_at >= 0.1:
+            self.reported_at = now
+            text = "Ollama: Scanning context: {0} files ({1:.1f} kb)...".format(
+                self.file_count, self.total_size / 1024.0)
+            sublime.set_timeout(lambda: sublime.status_message(text), 0)
+    
+    def run(self):
+        try:
+            files = ContextIndex.get_instance().scan(self.path, self.supported_extensions, self.on_file)
+        except Exception as e:
+            files = None
+            message = "Error processing path: {0}".format(str(e))
+            sublime.set_timeout(lambda: sublime.error_message(message), 0)
+            self.cancelled = True
+        finally:
+            if ContextScan.scans.get(self.path) is self:
+                del ContextScan.scans[self.path]
+        
+        if files is None:
+            if self.cancelled:
+                print("Ollama: Context scan of {0} stopped".format(self.path))
+            return
+        
+        summary = "Context added: {0} files ({1:.1f} kb, ~{2} tokens)".format(
+            self.file_count, self.total_size / 1024.0, self.sent_size // CHARS_PER_TOKEN)
+        print("Ollama: {0} from {1}".format(summary, self.path))
+        largest = sorted(self.largest, reverse=True)
+        for size, file_path in largest:
+            skipped = " (skipped, over context_max_file_kb)" if size > self.max_file_bytes else ""
+            print("Ollama:   {0:10.1f} kb  {1}{2}".format(size / 1024.0, file_path, skipped))
+        if largest:
+            summary += ", largest: {0}".format(os.path.basename(largest[0][1]))
+        sublime.set_timeout(lambda: sublime.status_message(summary), 0)
+
+class OllamaCancelContextScanCommand(sublime_plugin.WindowCommand):
+    def run(self):
+        if ContextScan.cancel():
+            sublime.status_message("Ollama: Context scan cancelled")
+        else:
+            sublime.status_message("Ollama: No context scan running")
 
 class OllamaRemoveContextCommand(sublime_plugin.WindowCommand):
     def run(self):
-        settings = sublime.load_settings('Ollama.sublime-settings')
+        settings = get_settings()
         context_paths = settings.get('context_paths', [])
         
         if not context_paths:
@@ -633,44 +2277,66 @@ class OllamaRemoveContextCommand(sublime_plugin.WindowCommand):
     
     def on_done(self, index):
         if index >= 0:
-            settings = sublime.load_settings('Ollama.sublime-settings')
-            context_paths = settings.get('context_paths', [])
+            context_paths = list(get_settings().get('context_paths', []))
             removed_path = context_paths.pop(index)
-            settings.set('context_paths', context_paths)
-            sublime.save_settings('Ollama.sublime-settings')
+            ContextScan.cancel(removed_path)
+            set_state('context_paths', context_paths)
             sublime.status_message("Removed context: {0}".format(removed_path))
 
-# Modify the RequestThread class to include context files
+class OllamaContextIndexListener(sublime_plugin.EventListener):
+    def on_post_save(self, view):
+        file_name = view.file_name()
+        if file_name:
+            ContextIndex.get_instance().invalidate(file_name)
+
 def get_context_files(context_paths, supported_extensions):
-    files_content = []
-    for path in context_paths:
+    return ContextIndex.get_instance().collect(context_paths, supported_extensions)
+
+def build_context(context_paths, supported_extensions, budget, prompt, view_text):
+    files = ContextIndex.get_instance().load_files(context_paths, supported_extensions)
+    settings = get_settings()
+    if settings.get('context_retrieval', 'keywords') == 'embeddings':
         try:
-            if '**' in path:
-                base_path = path.split('**')[0]
-                pattern = path.split('**')[1]
-                for root, _, files in os.walk(base_path):
-                    for file in files:
-                        if any(file.endswith('.' + ext) for ext in supported_extensions):
-                            file_path = os.path.join(root, file)
-                            if fnmatch.fnmatch(file_path, path):
-                                with open(file_path, 'r', encoding='utf-8') as f:
-                                    content = f.read()
-                                    files_content.append("File: {0}\n\n{1}\n\n".format(file_path, content))
-            else:
-                if os.path.isfile(path):
-                    if any(path.endswith('.' + ext) for ext in supported_extensions):
-                        with open(path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            files_content.append("File: {0}\n\n{1}\n\n".format(path, content))
-                elif os.path.isdir(path):
-                    for file in os.listdir(path):
-                        if any(file.endswith('.' + ext) for ext in supported_extensions):
-                            file_path = os.path.join(path, file)
-                            if os.path.isfile(file_path):
-                                with open(file_path, 'r', encoding='utf-8') as f:
-                                    content = f.read()
-                                    files_content.append("File: {0}\n\n{1}\n\n".format(file_path, content))
+            return retrieve_context(files, budget, prompt, view_text, settings)
         except Exception as e:
-            print("Error processing context path {0}: {1}".format(path, str(e)))
+            print("Ollama Error: Embedding retrieval failed, ranking by keywords: {0}".format(str(e)))
+    return ContextBuilder.get_instance().build(files, budget, prompt, view_text)
+
+def configure_vector_index(model):
+    # One index per embedding model, as their vectors are not comparable
+    directory = hashlib.sha1(model.encode('utf-8')).hexdigest()[:16]
+    index = VectorIndex.get_instance()
+    index.configure(os.path.join(sublime.cache_path(), 'Ollama', 'embeddings', directory))
+    return index
+
+def embed_texts(model, texts):
+    pool = EndpointPool.get_instance()
+    endpoint, response = pool.post('/api/embed', model, json={"model": model, "input": texts})
+    try:
+        response.raise_for_status()
+        return response.json()['embeddings']
+    finally:
+        pool.release(endpoint)
+
+def retrieve_context(files, budget, prompt, view_text, settings):
+    # Sends the context chunks closest to the prompt and the start of the
+    # selection or view; new and changed chunks are embedded first
+    model = settings.get('context_embedding_model', 'nomic-embed-text')
+    index = configure_vector_index(model)
+    embed = lambda texts: embed_texts(model, texts)
+    query = prompt + "\n\n" + view_text[:settings.get('context_query_chars', 2000)]
+    
+    def rank(chunks):
+        added = index.update(chunks, embed)
+        if added:
+            print("Ollama: Embedded {0} context chunks".format(added))
+        return index.scores(chunks, embed([query])[0])
     
-    return "\n".join(files_content)
+    return ContextBuilder.get_instance().retrieve(files, budget, rank, settings.get('context_top_k', 8))
+
+def report_context(bundle):
+    print("Ollama: Sending {0} of {1} context tokens".format(bundle.tokens, bundle.total_tokens))
+    for path in bundle.dropped:
+        print("Ollama: Dropped context file (over budget): {0}".format(path))
+    summary = bundle.summary()
+    sublime.set_timeout(lambda: sublime.status_message("Ollama: {0}".format(summary)), 0)
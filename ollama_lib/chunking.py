@@ -0,0 +1,72 @@
+import re
+
+
+# Lines that start a new top-level unit in common languages and in Markdown
+BOUNDARY_RE = re.compile(
+    r'^(?:#{1,6}\s|(?:async\s+)?def\s|class\s|function\s|func\s|fn\s|pub\s|impl\s|struct\s|'
+    r'interface\s|enum\s|module\s|export\s|public\s|private\s|protected\s|static\s|@)'
+)
+
+
+def split_segments(text):
+    # Break before blank-line separated paragraphs and top-level definitions
+    segments = []
+    current = []
+    previous_blank = False
+    for line in text.splitlines(True):
+        blank = not line.strip()
+        if current and not blank and (previous_blank or BOUNDARY_RE.match(line)):
+            # Keep decorators attached to the definition below them
+            if not (current[-1].startswith('@') and not previous_blank):
+                segments.append(''.join(current))
+                current = []
+        current.append(line)
+        previous_blank = blank
+    if current:
+        segments.append(''.join(current))
+    return segments
+
+
+def split_long(segment, max_chars):
+    # Fall back to line boundaries, and hard splits for single huge lines
+    pieces = []
+    current = []
+    size = 0
+    for line in segment.splitlines(True):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(''.join(current))
+                current = []
+                size = 0
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if size + len(line) > max_chars and current:
+            pieces.append(''.join(current))
+            current = []
+            size = 0
+        current.append(line)
+        size += len(line)
+    if current:
+        pieces.append(''.join(current))
+    return pieces
+
+
+def split_structural(text, max_chars):
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks = []
+    current = []
+    size = 0
+    for segment in split_segments(text):
+        pieces = split_long(segment, max_chars) if len(segment) > max_chars else [segment]
+        for piece in pieces:
+            if size + len(piece) > max_chars and current:
+                chunks.append(''.join(current))
+                current = []
+                size = 0
+            current.append(piece)
+            size += len(piece)
+    if current:
+        chunks.append(''.join(current))
+    return chunks
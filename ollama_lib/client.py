@@ -0,0 +1,86 @@
+import time
+import threading
+
+# requests is imported on first use: it takes most of the plugin's load time
+
+
+class OllamaClient:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.connect_timeout = 5.0
+        self.read_timeout = 300.0
+        self.retries = 2
+        self.backoff = 0.5
+        self.pool_size = 4
+        self._session = None
+        self._lock = threading.Lock()
+
+    def configure(self, connect_timeout=None, read_timeout=None, retries=None, backoff=None, pool_size=None):
+        with self._lock:
+            if connect_timeout is not None:
+                self.connect_timeout = float(connect_timeout)
+            if read_timeout is not None:
+                self.read_timeout = float(read_timeout)
+            if retries is not None:
+                self.retries = max(0, int(retries))
+            if backoff is not None:
+                self.backoff = float(backoff)
+            if pool_size is not None and int(pool_size) != self.pool_size:
+                self.pool_size = max(1, int(pool_size))
+                # Connections already checked out keep working on the old session
+                self._session = None
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                # pool_maxsize is the number of keep-alive connections kept per host
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, retries=None, **kwargs):
+        # retries overrides the configured count, e.g. 0 when the caller
+        # has another server to fail over to
+        import requests
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        if retries is None:
+            retries = self.retries
+        attempt = 0
+        while True:
+            try:
+                return self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError:
+                # Only failures to reach the server are retried; read timeouts
+                # and errors mid-stream are raised to the caller
+                if attempt >= retries:
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                attempt += 1
+                print("Ollama: Connection to {0} failed, retrying in {1:.1f}s ({2}/{3})".format(
+                    url, delay, attempt, retries))
+                time.sleep(delay)
@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+
+def completion_payload(model, prefix, suffix, max_tokens, keep_alive=None):
+    # A fill-in-the-middle request: Ollama lays out prompt and suffix with
+    # the model's own infill template
+    payload = {
+        "model": model,
+        "prompt": prefix,
+        "suffix": suffix,
+        "stream": True,
+        "options": {"num_predict": max_tokens}
+    }
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+
+class CompletionCache:
+    # Recent inline completions keyed by the text before and after the
+    # cursor, least recently used first. Returning to a spot, undoing or
+    # deleting what was just typed shows the earlier suggestion again
+    # without a request
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, max_entries):
+        with self._lock:
+            self.max_entries = max_entries
+            self._trim()
+
+    def get(self, model, prefix, suffix):
+        key = (model, prefix, suffix)
+        with self._lock:
+            completion = self._entries.get(key)
+            if completion is not None:
+                self._entries.move_to_end(key)
+            return completion
+
+    def put(self, model, prefix, suffix, completion):
+        with self._lock:
+            self._entries[(model, prefix, suffix)] = completion
+            self._entries.move_to_end((model, prefix, suffix))
+            self._trim()
+
+    def _trim(self):
+        while len(self._entries) > max(0, self.max_entries):
+            self._entries.popitem(last=False)
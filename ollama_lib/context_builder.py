@@ -0,0 +1,282 @@
+import re
+import sys
+import math
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+
+TERM_RE = re.compile(r'[A-Za-z0-9]{2,}')
+
+# Rough average for code and English prose across common tokenizers
+CHARS_PER_TOKEN = 4
+
+CHUNK_CHARS = 1500
+
+# Only the most frequent terms of the active view are used for ranking
+MAX_VIEW_TERMS = 50
+
+# Rough size of one term count in a chunk's term table, for the cache budget
+TERM_ENTRY_BYTES = 40
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def tokenize(text):
+    return [term.lower() for term in TERM_RE.findall(text)]
+
+def term_counts(text):
+    # Interned, so chunks share one copy of each term instead of holding their own
+    return dict((sys.intern(term), count) for term, count in Counter(tokenize(text)).items())
+
+def split_chunks(content, chunk_chars=CHUNK_CHARS):
+    # Prefer breaking on blank lines, but never let a chunk grow past twice the target size
+    chunks = []
+    current = []
+    size = 0
+    for line in content.splitlines(True):
+        current.append(line)
+        size += len(line)
+        if (size >= chunk_chars and not line.strip()) or size >= 2 * chunk_chars:
+            chunks.append(''.join(current))
+            current = []
+            size = 0
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+class Chunk:
+    def __init__(self, path, position, text):
+        self.path = path
+        self.position = position
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.terms = term_counts(text)
+        self.length = sum(self.terms.values())
+        # Identifies the text in the embedding index
+        self.digest = hashlib.sha1(text.encode('utf-8', 'replace')).hexdigest()
+
+
+def file_parts(path, content):
+    # Same layout as get_context_files, without copying the file content
+    return ["File: {0}\n\n".format(path), content, "\n\n"]
+
+
+def unique_files(files):
+    # Overlapping context paths can yield the same file more than once
+    seen = set()
+    return [(path, content) for path, content in files if not (path in seen or seen.add(path))]
+
+
+class ContextBundle:
+    def __init__(self, parts, tokens, total_tokens, included, dropped):
+        self.parts = parts
+        self.tokens = tokens
+        self.total_tokens = total_tokens
+        self.included = included
+        self.dropped = dropped
+
+    def summary(self):
+        summary = "context {0} tokens from {1} files".format(self.tokens, len(self.included))
+        if self.dropped:
+            summary += ", {0} dropped".format(len(self.dropped))
+        return summary
+
+
+class ContextBuilder:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # path -> (length, hash, [Chunk], bytes), least recently used first.
+        # The content itself is not kept: it is the cached string from the
+        # context index, whose hash Python computes once and remembers
+        self._chunks = OrderedDict()
+        self._bytes = 0
+        # (files, budget, prompt, view_text, bundle) of the last build
+        self._last = None
+        self._lock = threading.Lock()
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def chunks_for(self, path, content):
+        key = (len(content), hash(content))
+        with self._lock:
+            entry = self._chunks.get(path)
+            if entry is not None and entry[:2] == key:
+                self._chunks.move_to_end(path)
+                return entry[2]
+
+        chunks = [Chunk(path, i, text) for i, text in enumerate(split_chunks(content))]
+        size = len(content) + TERM_ENTRY_BYTES * sum(len(chunk.terms) for chunk in chunks)
+        with self._lock:
+            self._drop(path)
+            self._chunks[path] = key + (chunks, size)
+            self._bytes += size
+            self._evict()
+        return chunks
+
+    def forget(self, paths):
+        with self._lock:
+            for path in list(self._chunks):
+                if path not in paths:
+                    self._drop(path)
+
+    def _drop(self, path):
+        entry = self._chunks.pop(path, None)
+        if entry is not None:
+            self._bytes -= entry[3]
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._chunks:
+            _, entry = self._chunks.popitem(last=False)
+            self._bytes -= entry[3]
+
+    def build(self, files, budget, prompt, view_text=''):
+        # A build while the prompt was typed may already have made this bundle
+        with self._lock:
+            last = self._last
+        if last is not None and self._same_request(last, files, budget, prompt, view_text):
+            return last[4]
+        bundle = self._build(files, budget, prompt, view_text)
+        with self._lock:
+            self._last = (files, budget, prompt, view_text, bundle)
+        return bundle
+
+    def _same_request(self, last, files, budget, prompt, view_text):
+        last_files, last_budget, last_prompt, last_view_text, _ = last
+        if (budget, prompt, view_text) != (last_budget, last_prompt, last_view_text):
+            return False
+        # Unchanged files come back as the same cached strings
+        return len(files) == len(last_files) and all(
+            path == last_path and content is last_content
+            for (path, content), (last_path, last_content) in zip(files, last_files))
+
+    def _build(self, files, budget, prompt, view_text):
+        files = unique_files(files)
+        total_tokens = sum(estimate_tokens(content) for _, content in files)
+
+        # Everything fits: send all files in full, in their original order
+        if not budget or total_tokens <= budget:
+            parts = []
+            for i, (path, content) in enumerate(files):
+                if i:
+                    parts.append("\n")
+                parts.extend(file_parts(path, content))
+            return ContextBundle(parts, total_tokens, total_tokens, [path for path, _ in files], [])
+
+        chunks = self.all_chunks(files)
+        scores = self.score(chunks, self.query_terms(prompt, view_text))
+        return self.pack(files, chunks, scores, budget, total_tokens)
+
+    def retrieve(self, files, budget, rank, top_k):
+        # Sends only the top_k chunks ranked by rank(chunks) -> scores, even
+        # when every file would fit
+        files = unique_files(files)
+        total_tokens = sum(estimate_tokens(content) for _, content in files)
+        chunks = self.all_chunks(files)
+        return self.pack(files, chunks, rank(chunks), budget, total_tokens, top_k)
+
+    def all_chunks(self, files):
+        chunks = []
+        for path, content in files:
+            chunks.extend(self.chunks_for(path, content))
+        self.forget(set(path for path, _ in files))
+        return chunks
+
+    def pack(self, files, chunks, scores, budget, total_tokens, limit=None):
+        # Greedily pack the highest scoring chunks, keeping the file headers in the budget
+        ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+        selected = set()
+        headers = set()
+        used = 0
+        for i in ranked:
+            if limit is not None and len(selected) >= limit:
+                break
+            chunk = chunks[i]
+            cost = chunk.tokens
+            if chunk.path not in headers:
+                cost += estimate_tokens("File: {0}\n\n".format(chunk.path))
+            if budget and used + cost > budget:
+                continue
+            selected.add(i)
+            headers.add(chunk.path)
+            used += cost
+
+        # Emit the selected chunks grouped per file, in source order
+        parts = []
+        included = []
+        dropped = []
+        index = 0
+        for path, content in files:
+            file_chunks = []
+            skipped = False
+            while index < len(chunks) and chunks[index].path == path:
+                if index in selected:
+                    if skipped and file_chunks:
+                        file_chunks.append("...\n")
+                    file_chunks.append(chunks[index].text)
+                    skipped = False
+                else:
+                    skipped = True
+                index += 1
+            if file_chunks:
+                if included:
+                    parts.append("\n")
+                included.append(path)
+                parts.append("File: {0}\n\n".format(path))
+                parts.extend(file_chunks)
+                parts.append("\n\n")
+            else:
+                dropped.append(path)
+
+        return ContextBundle(parts, used, total_tokens, included, dropped)
+
+    def query_terms(self, prompt, view_text):
+        query = Counter()
+        for term in tokenize(prompt):
+            query[term] += 2
+        for term, _ in Counter(tokenize(view_text)).most_common(MAX_VIEW_TERMS):
+            query[term] += 1
+        return query
+
+    def score(self, chunks, query):
+        if not chunks or not query:
+            return [0.0] * len(chunks)
+
+        count = len(chunks)
+        avg_length = float(sum(chunk.length for chunk in chunks)) / count or 1.0
+        document_frequency = Counter()
+        for chunk in chunks:
+            for term in query:
+                if term in chunk.terms:
+                    document_frequency[term] += 1
+
+        idf = {}
+        for term, df in document_frequency.items():
+            idf[term] = math.log(1.0 + (count - df + 0.5) / (df + 0.5))
+
+        scores = []
+        for chunk in chunks:
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * chunk.length / avg_length)
+            score = 0.0
+            for term, weight in query.items():
+                frequency = chunk.terms.get(term)
+                if frequency:
+                    score += weight * idf[term] * frequency * (BM25_K1 + 1.0) / (frequency + norm)
+            scores.append(score)
+        return scores
@@ -0,0 +1,249 @@
+import os
+import json
+import codecs
+import threading
+from collections import OrderedDict
+
+from .pathmatch import PathMatcher
+
+
+# Bytes inspected for NUL bytes to tell binary files from text
+BINARY_SNIFF_BYTES = 8192
+
+
+def decode_text(data):
+    if data.startswith(codecs.BOM_UTF8):
+        return data[len(codecs.BOM_UTF8):].decode('utf-8', 'replace')
+    if data.startswith(codecs.BOM_UTF16_LE) or data.startswith(codecs.BOM_UTF16_BE):
+        return data.decode('utf-16', 'replace')
+    if b'\0' in data[:BINARY_SNIFF_BYTES]:
+        return None
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        # Most non-UTF-8 text files in the wild are Windows-1252 / Latin-1
+        return data.decode('cp1252', 'replace')
+
+
+class ContextIndex:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = 512 * 1024
+        self.workers = 8
+        self.ignored_dirs = None
+        self.use_ignore_files = True
+        self._executor = None
+        # path -> (mtime, size, content), least recently used first; content
+        # is None for files that were skipped as binary or too large
+        self._files = OrderedDict()
+        self._bytes = 0
+        # (context path, extensions) -> ({dir: mtime}, [file paths])
+        self._walks = {}
+        self._lock = threading.RLock()
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def configure(self, max_bytes=None, max_file_bytes=None, workers=None, ignored_dirs=None,
+                  use_ignore_files=None):
+        if max_bytes is not None:
+            self.set_max_bytes(max_bytes)
+        with self._lock:
+            if ignored_dirs is not None and ignored_dirs != self.ignored_dirs:
+                self.ignored_dirs = list(ignored_dirs)
+                self._walks.clear()
+            if use_ignore_files is not None and use_ignore_files != self.use_ignore_files:
+                self.use_ignore_files = use_ignore_files
+                self._walks.clear()
+            if max_file_bytes is not None and max_file_bytes != self.max_file_bytes:
+                self.max_file_bytes = max_file_bytes
+                # Skip decisions depend on the size cap
+                for path in [path for path, entry in self._files.items() if entry[2] is None]:
+                    self._drop(path)
+            if workers is not None and max(1, int(workers)) != self.workers:
+                self.workers = max(1, int(workers))
+                self._shutdown_executor()
+
+    def close(self):
+        with self._lock:
+            self._shutdown_executor()
+
+    def collect(self, context_paths, supported_extensions):
+        files_content = [
+            "File: {0}\n\n{1}\n\n".format(file_path, content)
+            for file_path, content in self.load_files(context_paths, supported_extensions)
+        ]
+        return "\n".join(files_content)
+
+    def load_files(self, context_paths, supported_extensions):
+        file_paths = []
+        for path in context_paths:
+            try:
+                file_paths.extend(self.resolve(path, supported_extensions))
+            except Exception as e:
+                print("Error processing context path {0}: {1}".format(path, str(e)))
+
+        # Files are read in parallel, results keep the order of the context paths
+        if len(file_paths) > 1:
+            contents = list(self._get_executor().map(self._read_or_skip, file_paths))
+        else:
+            contents = [self._read_or_skip(file_path) for file_path in file_paths]
+
+        return [(file_path, content) for file_path, content in zip(file_paths, contents)
+                if content is not None]
+
+    def resolve(self, path, supported_extensions):
+        key = (path, tuple(supported_extensions))
+        with self._lock:
+            cached = self._walks.get(key)
+
+        # Re-stat the walked directories only; any added, removed or renamed
+        # entry changes the mtime of its parent directory
+        if cached is not None and self._dirs_unchanged(cached[0]):
+            return cached[1]
+
+        dir_mtimes, files = self._walk(path, supported_extensions)
+        with self._lock:
+            self._walks[key] = (dir_mtimes, files)
+        return files
+
+    def scan(self, path, supported_extensions, on_file=None):
+        # Walks a context path like resolve and keeps the result for the next
+        # request. on_file(file path, size) is called for each file and can
+        # return False to stop; returns the files, or None when stopped
+        with self._lock:
+            matcher = PathMatcher(path, supported_extensions, self.ignored_dirs, self.use_ignore_files)
+        files = []
+        for file_path, entry in matcher.walk():
+            try:
+                size = entry.stat().st_size if entry else os.path.getsize(file_path)
+            except OSError:
+                size = 0
+            files.append(file_path)
+            if on_file is not None and on_file(file_path, size) is False:
+                return None
+
+        with self._lock:
+            self._walks[(path, tuple(supported_extensions))] = (matcher.dir_mtimes, files)
+        return files
+
+    def read(self, file_path):
+        stat = os.stat(file_path)
+        with self._lock:
+            entry = self._files.get(file_path)
+            if entry is not None and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+                self._files.move_to_end(file_path)
+                return entry[2]
+
+        if stat.st_size > self.max_file_bytes:
+            print("Ollama: Skipping context file larger than {0} kb: {1}".format(
+                self.max_file_bytes // 1024, file_path))
+            content = None
+        else:
+            with open(file_path, 'rb') as f:
+                content = decode_text(f.read())
+            if content is None:
+                print("Ollama: Skipping binary context file: {0}".format(file_path))
+
+        self._store(file_path, stat.st_mtime, stat.st_size, content)
+        return content
+
+    def _read_or_skip(self, file_path):
+        try:
+            return self.read(file_path)
+        except Exception as e:
+            print("Error reading context file {0}: {1}".format(file_path, str(e)))
+            return None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Imported here, it is slow to import and only needed for reads
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _shutdown_executor(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def invalidate(self, file_path):
+        directory = os.path.dirname(file_path)
+        with self._lock:
+            self._drop(file_path)
+            for key in list(self._walks):
+                dir_mtimes, files = self._walks[key]
+                if directory in dir_mtimes or file_path in files:
+                    del self._walks[key]
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            self._walks.clear()
+            self._bytes = 0
+
+    def save(self, cache_file):
+        with self._lock:
+            files = [[path] + list(entry) for path, entry in self._files.items()]
+
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = cache_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'files': files}, f)
+        os.replace(tmp_file, cache_file)
+
+    def load(self, cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get('version') != 1:
+            return
+
+        # Entries are re-validated against mtime and size when they are read
+        for path, mtime, size, content in data.get('files', []):
+            self._store(path, mtime, size, content)
+
+    def _store(self, file_path, mtime, size, content):
+        with self._lock:
+            self._drop(file_path)
+            self._files[file_path] = (mtime, size, content)
+            self._bytes += len(content or '')
+            self._evict()
+
+    def _drop(self, file_path):
+        entry = self._files.pop(file_path, None)
+        if entry is not None:
+            self._bytes -= len(entry[2] or '')
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._files:
+            _, entry = self._files.popitem(last=False)
+            self._bytes -= len(entry[2] or '')
+
+    def _dirs_unchanged(self, dir_mtimes):
+        try:
+            for directory, mtime in dir_mtimes.items():
+                if os.stat(directory).st_mtime != mtime:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def _walk(self, path, supported_extensions):
+        matcher = PathMatcher(path, supported_extensions, self.ignored_dirs, self.use_ignore_files)
+        files = matcher.files()
+        return matcher.dir_mtimes, files
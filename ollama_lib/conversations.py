@@ -0,0 +1,51 @@
+import threading
+
+
+class Conversation:
+    def __init__(self, model, system_prompt):
+        self.model = model
+        self.system_prompt = system_prompt
+        self.messages = [{'role': 'system', 'content': system_prompt}]
+        self._lock = threading.Lock()
+
+    def is_empty(self):
+        with self._lock:
+            return len(self.messages) <= 1
+
+    def request_messages(self, content):
+        # Earlier turns are sent unchanged, so the server can reuse the
+        # evaluated prompt prefix and only process the new turn
+        with self._lock:
+            return self.messages + [{'role': 'user', 'content': content}]
+
+    def record(self, content, answer):
+        with self._lock:
+            self.messages.append({'role': 'user', 'content': content})
+            self.messages.append({'role': 'assistant', 'content': answer})
+
+
+class ConversationStore:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._conversations = {}
+        self._lock = threading.Lock()
+
+    def get(self, view_id, model, system_prompt):
+        # Switching model or system prompt starts a new conversation
+        with self._lock:
+            conversation = self._conversations.get(view_id)
+            if conversation is None or conversation.model != model or conversation.system_prompt != system_prompt:
+                conversation = Conversation(model, system_prompt)
+                self._conversations[view_id] = conversation
+            return conversation
+
+    def reset(self, view_id):
+        with self._lock:
+            return self._conversations.pop(view_id, None) is not None
@@ -0,0 +1,229 @@
+import time
+import threading
+
+from .client import OllamaClient
+
+
+STRATEGY_LEAST_OUTSTANDING = 'least_outstanding'
+STRATEGY_LATENCY = 'latency'
+
+# Weight of the newest sample in the moving average of time to first token
+LATENCY_SMOOTHING = 0.3
+
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url
+        # None until the first health check or request tells
+        self.healthy = None
+        self.models = None
+        self.latency = None
+        self.outstanding = 0
+        self.assigned = 0
+        self.failures = 0
+        self.checked_at = 0
+        self.down_until = 0
+
+    def is_up(self, now=None):
+        # A failed endpoint gets another chance once its down time is over
+        return self.healthy is not False or (now or time.time()) >= self.down_until
+
+    def has_model(self, model):
+        return self.models is None or model in self.models
+
+
+class EndpointPool:
+    # Routes requests across Ollama servers. Servers are health checked with
+    # /api/tags, which also tells which models each one has; requests go to
+    # a healthy server with the model and the fewest requests in flight (or
+    # the lowest expected wait), and servers that refuse connections are
+    # skipped for down_seconds
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.endpoints = []
+        self.strategy = STRATEGY_LEAST_OUTSTANDING
+        self.health_interval = 60
+        self.down_seconds = 15
+        self._checking = False
+        self._lock = threading.Lock()
+
+    def configure(self, urls, strategy=None, health_interval=None, down_seconds=None):
+        urls = [url.rstrip('/') for url in urls if url]
+        with self._lock:
+            # Endpoints that stay keep their state and requests in flight
+            existing = dict((endpoint.url, endpoint) for endpoint in self.endpoints)
+            self.endpoints = [existing.get(url) or Endpoint(url) for url in urls]
+            if strategy is not None:
+                self.strategy = strategy
+            if health_interval is not None:
+                self.health_interval = health_interval
+            if down_seconds is not None:
+                self.down_seconds = down_seconds
+
+    def urls(self):
+        with self._lock:
+            return [endpoint.url for endpoint in self.endpoints]
+
+    def choose(self, model=None, exclude=(), prefer=None):
+        with self._lock:
+            return self._choose(model, exclude, prefer)
+
+    def acquire(self, model=None, exclude=(), prefer=None):
+        # Picks an endpoint and counts the request as in flight until release
+        with self._lock:
+            endpoint = self._choose(model, exclude, prefer)
+            if endpoint is not None:
+                endpoint.outstanding += 1
+                endpoint.assigned += 1
+        self._check_if_stale()
+        return endpoint
+
+    def release(self, endpoint, latency=None, failed=False):
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            if failed:
+                self._mark_down(endpoint)
+            elif latency is not None:
+                endpoint.healthy = True
+                endpoint.failures = 0
+                if endpoint.latency is None:
+                    endpoint.latency = latency
+                else:
+                    endpoint.latency += LATENCY_SMOOTHING * (latency - endpoint.latency)
+
+    def post(self, path, model=None, prefer=None, **kwargs):
+        # Sends to the chosen endpoint, failing over to the next one while
+        # servers refuse the connection. Returns (endpoint, response); the
+        # endpoint counts the request as in flight until release. prefer is
+        # a server to use if it is up, e.g. one holding the prompt in cache
+        import requests
+        client = OllamaClient.get_instance()
+        tried = []
+        while True:
+            endpoint = self.acquire(model, tried, prefer)
+            if endpoint is None:
+                raise ValueError("No Ollama server configured")
+            tried.append(endpoint.url)
+            # Only retry the same server when there is nowhere else to go
+            retries = 0 if self.has_alternatives(model, tried) else None
+            try:
+                return endpoint, client.post(endpoint.url + path, retries=retries, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                self.release(endpoint, failed=True)
+                if self.choose(model, tried) is None:
+                    raise
+                print("Ollama: Could not connect to {0}, failing over: {1}".format(endpoint.url, str(e)))
+            except Exception:
+                # Timeouts and other errors are not failed over, but the
+                # request is no longer in flight
+                self.release(endpoint)
+                raise
+
+    def has_alternatives(self, model=None, exclude=()):
+        now = time.time()
+        with self._lock:
+            return any(endpoint.url not in exclude and endpoint.is_up(now) and endpoint.has_model(model)
+                       for endpoint in self.endpoints)
+
+    def check(self, endpoint):
+        # Returns the server's model list, or None if it could not be reached
+        import requests
+        started = time.time()
+        try:
+            response = OllamaClient.get_instance().get(
+                "{0}/api/tags".format(endpoint.url), retries=0, timeout=(3, 10))
+            response.raise_for_status()
+            models = response.json().get('models', [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            with self._lock:
+                endpoint.checked_at = time.time()
+                self._mark_down(endpoint)
+            print("Ollama: Health check of {0} failed: {1}".format(endpoint.url, str(e)))
+            return None
+
+        with self._lock:
+            endpoint.checked_at = time.time()
+            endpoint.healthy = True
+            endpoint.failures = 0
+            endpoint.models = set(data.get('name') or data.get('model', '') for data in models)
+            if endpoint.latency is None:
+                endpoint.latency = endpoint.checked_at - started
+        return models
+
+    def check_all(self):
+        # Checks every endpoint in parallel; returns url -> model list or None
+        with self._lock:
+            endpoints = list(self.endpoints)
+        results = {}
+
+        def run(endpoint):
+            results[endpoint.url] = self.check(endpoint)
+
+        threads = [threading.Thread(target=run, args=(endpoint,)) for endpoint in endpoints]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _check_if_stale(self):
+        # Periodic health checks piggyback on requests, in the background
+        if len(self.endpoints) < 2:
+            return
+        now = time.time()
+        with self._lock:
+            if self._checking:
+                return
+            stale = [endpoint for endpoint in self.endpoints
+                     if now - endpoint.checked_at > self.health_interval]
+            if not stale:
+                return
+            self._checking = True
+
+        def run():
+            try:
+                for endpoint in stale:
+                    self.check(endpoint)
+            finally:
+                with self._lock:
+                    self._checking = False
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def _mark_down(self, endpoint):
+        endpoint.healthy = False
+        endpoint.failures += 1
+        # Back off longer from servers that keep failing
+        endpoint.down_until = time.time() + self.down_seconds * min(endpoint.failures, 8)
+
+    def _choose(self, model, exclude, prefer=None):
+        now = time.time()
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.url not in exclude]
+        if not candidates:
+            return None
+        up = [endpoint for endpoint in candidates if endpoint.is_up(now)]
+        # Prefer servers known to have the model; if none is up, try anyway
+        candidates = [endpoint for endpoint in up if endpoint.has_model(model)] or up or candidates
+        for endpoint in candidates:
+            if endpoint.url == prefer:
+                return endpoint
+
+        if self.strategy == STRATEGY_LATENCY:
+            # Expected wait: the typical time to first token for every
+            # request ahead plus this one; unmeasured servers get tried
+            def key(endpoint):
+                return ((endpoint.latency or 0.0) * (endpoint.outstanding + 1), endpoint.assigned)
+        else:
+            def key(endpoint):
+                return (endpoint.outstanding, endpoint.assigned)
+        return min(candidates, key=key)
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def text_hash(parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode('utf-8', 'replace'))
+    return digest.hexdigest()
+
+
+def format_timestamp(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+class HistoryStore:
+    # Append-only JSONL log of prompts. Each line is either a new entry or a
+    # patch of fields for an earlier entry (the response arrives later); the
+    # in-memory index merges them, and the file is compacted once it holds
+    # many superseded lines
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.path = None
+        self.max_entries = 10000
+        # id -> entry, oldest first
+        self._entries = None
+        # Lower-cased prompt -> id of its newest entry
+        self._latest = {}
+        # Model -> ids of its entries, oldest first
+        self._by_model = {}
+        self._lines = 0
+        self._next_id = 1
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    def configure(self, path, max_entries=None):
+        with self._lock:
+            if path != self.path:
+                self.path = path
+                self._entries = None
+                self._notify('clear', None)
+            if max_entries is not None:
+                self.max_entries = max_entries
+
+    def add_listener(self, listener):
+        # Called with (event, entry) under the store lock: 'add' for a new
+        # entry, 'update', 'remove' when it was superseded or compacted away,
+        # and 'clear' (entry is None) when all entries are gone
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def is_empty(self):
+        with self._lock:
+            self._load()
+            return not self._entries
+
+    def append(self, prompt, model=None, **fields):
+        entry = {'id': None, 'timestamp': fields.pop('timestamp', None) or time.time(),
+                 'prompt': prompt, 'model': model}
+        entry.update(fields)
+        with self._lock:
+            self._load()
+            entry['id'] = self._next_id
+            self._write_line(entry)
+            self._index(entry, notify=True)
+            # Leave some slack so compaction runs once per many appends
+            slack = max(self.max_entries // 4, 64)
+            if len(self._entries) > self.max_entries + slack or self._lines > 2 * (len(self._latest) + slack):
+                self._compact()
+        return entry['id']
+
+    def update(self, entry_id, **fields):
+        with self._lock:
+            self._load()
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                return
+            entry.update(fields)
+            self._write_line({'id': entry_id, 'patch': fields})
+            self._notify('update', entry)
+
+    def get(self, entry_id):
+        with self._lock:
+            self._load()
+            return self._entries.get(entry_id)
+
+    def entries(self, model=None, text=None, limit=None, unique=True):
+        # Newest first; by default only the newest entry of each prompt
+        with self._lock:
+            self._load()
+            if model is not None:
+                ids = self._by_model.get(model, [])
+            else:
+                ids = list(self._entries)
+
+            text = text.lower() if text else None
+            result = []
+            seen = set()
+            for entry_id in reversed(ids):
+                entry = self._entries.get(entry_id)
+                if entry is None:
+                    continue
+                key = entry['prompt'].lower()
+                if unique:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                if text and text not in key and text not in (entry.get('response') or '').lower():
+                    continue
+                result.append(entry)
+                if limit and len(result) >= limit:
+                    break
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._latest = {}
+            self._by_model = {}
+            self._lines = 0
+            if self.path and os.path.exists(self.path):
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+            self._notify('clear', None)
+
+    def _notify(self, event, entry):
+        for listener in self._listeners:
+            try:
+                listener(event, entry)
+            except Exception as e:
+                print("Ollama Error: History listener failed: {0}".format(str(e)))
+
+    def _index(self, entry, notify=False):
+        entry_id = entry['id']
+        key = entry['prompt'].lower()
+        previous = self._latest.get(key)
+        if notify and previous is not None:
+            self._notify('remove', self._entries[previous])
+        self._entries[entry_id] = entry
+        self._latest[key] = entry_id
+        self._by_model.setdefault(entry.get('model'), []).append(entry_id)
+        self._next_id = max(self._next_id, entry_id + 1)
+        if notify:
+            self._notify('add', entry)
+
+    def _write_line(self, record):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+        self._lines += 1
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = OrderedDict()
+        self._latest = {}
+        self._by_model = {}
+        self._lines = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if 'patch' in record:
+                        entry = self._entries.get(record.get('id'))
+                        if entry is not None:
+                            entry.update(record['patch'])
+                    elif 'prompt' in record and 'id' in record:
+                        self._index(record)
+        except OSError:
+            pass
+
+    def _compact(self):
+        # Keep the newest entry of each prompt, up to max_entries of them
+        latest = set(self._latest.values())
+        kept = [entry for entry in self._entries.values() if entry['id'] in latest]
+        for entry in kept[:-self.max_entries]:
+            self._notify('remove', entry)
+        kept = kept[-self.max_entries:]
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in kept:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+        self._entries = OrderedDict()
+        self._latest = {}
+        self._by_model = {}
+        for entry in kept:
+            self._index(entry)
+        self._lines = len(kept)
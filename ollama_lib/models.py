@@ -0,0 +1,115 @@
+import time
+import threading
+
+from .endpoints import EndpointPool
+
+
+def format_size(size):
+    size = float(size or 0)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return "{0:.1f} {1}".format(size, unit)
+        size /= 1024
+
+
+class ModelInfo:
+    def __init__(self, data):
+        details = data.get('details') or {}
+        self.name = data.get('name') or data.get('model', '')
+        self.size = data.get('size', 0)
+        self.family = details.get('family', '')
+        self.parameter_size = details.get('parameter_size', '')
+        self.quantization = details.get('quantization_level', '')
+        self.modified_at = data.get('modified_at', '')
+        # Servers that have the model
+        self.endpoints = []
+
+    def describe(self):
+        parts = [self.family, self.parameter_size, self.quantization]
+        if self.size:
+            parts.append(format_size(self.size))
+        if len(self.endpoints) > 1:
+            parts.append("{0} servers".format(len(self.endpoints)))
+        return " · ".join(part for part in parts if part)
+
+
+class ModelCatalog:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.urls = None
+        self.ttl = 300
+        self.models = []
+        self.fetched_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = None
+        self._callbacks = []
+
+    def configure(self, urls, ttl=None):
+        urls = tuple(urls)
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if urls != self.urls:
+                self.urls = urls
+                self.models = []
+                self.fetched_at = 0
+
+    def is_stale(self):
+        return not self.models or time.time() - self.fetched_at > self.ttl
+
+    def refresh(self):
+        # The union of the models on every server; listing them doubles as
+        # the servers' health check
+        urls = self.urls
+        results = EndpointPool.get_instance().check_all()
+        if not any(results.get(url) is not None for url in urls):
+            raise IOError("No Ollama server reachable at {0}".format(", ".join(urls)))
+
+        models = []
+        by_name = {}
+        for url in urls:
+            for data in results.get(url) or []:
+                model = ModelInfo(data)
+                if model.name not in by_name:
+                    by_name[model.name] = model
+                    models.append(model)
+                by_name[model.name].endpoints.append(url)
+        with self._lock:
+            # Ignore results for servers that were replaced in the meantime
+            if urls == self.urls:
+                self.models = models
+                self.fetched_at = time.time()
+        return models
+
+    def refresh_async(self, callback=None):
+        # Concurrent refreshes share one request; every callback receives
+        # the error or None once it finishes
+        with self._lock:
+            if callback is not None:
+                self._callbacks.append(callback)
+            if self._refreshing is not None:
+                return
+            self._refreshing = threading.Thread(target=self._run_refresh)
+            self._refreshing.daemon = True
+            self._refreshing.start()
+
+    def _run_refresh(self):
+        error = None
+        try:
+            self.refresh()
+        except Exception as e:
+            error = e
+            print("Ollama Error: Could not fetch models: {0}".format(str(e)))
+        with self._lock:
+            callbacks = self._callbacks
+            self._callbacks = []
+            self._refreshing = None
+        for callback in callbacks:
+            callback(error)
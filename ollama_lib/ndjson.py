@@ -0,0 +1,71 @@
+import re
+import json
+import codecs
+
+
+# Bytes asked for per read of a streamed response. Chunked responses return
+# what has arrived so far, so this bounds the read size without adding latency
+READ_CHUNK_BYTES = 16 * 1024
+
+# The text of a streamed token. Ollama writes lines compactly, and every
+# line but the final one ends with NOT_DONE
+FIELD_RES = {
+    'response': re.compile(r'"response":"((?:[^"\\]|\\.)*)"'),
+    'content': re.compile(r'"content":"((?:[^"\\]|\\.)*)"')
+}
+
+NOT_DONE = '"done":false}'
+
+
+def iter_lines(chunks):
+    # Decodes UTF-8 incrementally, so characters split across chunks survive
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    pending = ''
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if pending:
+            text = pending + text
+        elif text.find('\n') == len(text) - 1:
+            # The common case while streaming: one complete line per read
+            pending = ''
+            text = text.strip()
+            if text:
+                yield text
+            continue
+        lines = text.split('\n')
+        pending = lines.pop()
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+    pending = (pending + decoder.decode(b'', True)).strip()
+    if pending:
+        yield pending
+
+
+def iter_tokens(chunks, field='response', fast=True):
+    # Yields (text, data) per line. With fast, token lines only have the text
+    # field pulled out and data is None; other lines (the final one with the
+    # timings, errors) are fully decoded and text is None unless present
+    field_re = FIELD_RES[field]
+    prefix = '"{0}":"'.format(field)
+    for line in iter_lines(chunks):
+        if fast and line.endswith(NOT_DONE):
+            start = line.find(prefix)
+            if start >= 0:
+                start += len(prefix)
+                end = line.find('"', start)
+                text = line[start:end]
+                if '\\' in text:
+                    # Escaped characters, possibly an escaped quote
+                    match = field_re.search(line)
+                    text = json.loads('"' + match.group(1) + '"')
+                yield text, None
+                continue
+
+        data = json.loads(line)
+        if field == 'content':
+            text = data['message'].get('content') if 'message' in data else None
+        else:
+            text = data.get('response')
+        yield text, data
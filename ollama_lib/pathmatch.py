@@ -0,0 +1,277 @@
+import os
+import re
+import fnmatch
+
+
+DEFAULT_IGNORED_DIRS = [
+    ".git", ".hg", ".svn", "node_modules", "bower_components", "__pycache__",
+    ".venv", "venv", ".tox", ".nox", ".mypy_cache", ".pytest_cache",
+    ".ruff_cache", ".idea", ".vscode", "build", "dist", "target", ".next"
+]
+
+IGNORE_FILES = (".gitignore", ".ollamaignore")
+
+WILDCARDS = re.compile(r'[*?\[]')
+
+scandir = getattr(os, 'scandir', None)
+
+
+def has_wildcards(path):
+    return WILDCARDS.search(path) is not None
+
+def translate_pattern(pattern):
+    # gitignore wildcards: * and ? stop at slashes, ** crosses directories
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i) and (i == 0 or pattern[i - 1] == '/'):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif c == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif c == '?':
+            parts.append('[^/]')
+            i += 1
+        elif c == '[' and pattern.find(']', i + 2) > 0:
+            end = pattern.find(']', i + 2)
+            chars = pattern[i + 1:end]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            parts.append('[' + chars.replace('\\', '\\\\') + ']')
+            i = end + 1
+        else:
+            parts.append(re.escape(c))
+            i += 1
+    return '(?:' + ''.join(parts) + r')\Z'
+
+def find_repository_root(directory):
+    # The nearest directory at or above directory that holds a .git entry
+    directory = os.path.abspath(directory)
+    while True:
+        if os.path.exists(os.path.join(directory, '.git')):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+class IgnoreRules:
+    # The subset of .gitignore syntax that matters for picking context files:
+    # comments, negation, directory-only and anchored patterns, and **
+    def __init__(self, directory, lines):
+        # Absolute, like the paths match is given
+        self.directory = os.path.abspath(directory)
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            # Patterns containing a slash are relative to the ignore file
+            anchored = '/' in line
+            line = line.lstrip('/')
+            if not line:
+                continue
+
+            self.rules.append((re.compile(translate_pattern(line)), negate, dir_only, anchored))
+
+    @classmethod
+    def load(cls, directory):
+        rules = []
+        for name in IGNORE_FILES:
+            try:
+                with open(os.path.join(directory, name), 'r', encoding='utf-8', errors='replace') as f:
+                    rules.extend(f.readlines())
+            except OSError:
+                continue
+        return cls(directory, rules) if rules else None
+
+    def match(self, path, is_dir):
+        # None if no rule applies, otherwise whether the path is ignored
+        # Paths below the ignore file's directory always start with it
+        relative = path[len(self.directory):].lstrip('/' + os.sep)
+        if os.sep != '/':
+            relative = relative.replace(os.sep, '/')
+        name = relative.rsplit('/', 1)[-1]
+        result = None
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative if anchored else name):
+                result = not negate
+        return result
+
+
+class PathMatcher:
+    def __init__(self, path, supported_extensions, ignored_dirs=None, use_ignore_files=True):
+        self.path = path
+        self.extensions = tuple('.' + ext for ext in supported_extensions)
+        self.extension_set = frozenset(ext for ext in supported_extensions if '.' not in ext)
+        self.ignored_dirs = frozenset(DEFAULT_IGNORED_DIRS if ignored_dirs is None else ignored_dirs)
+        self.use_ignore_files = use_ignore_files
+        # Directory -> mtime for every directory looked at
+        self.dir_mtimes = {}
+
+        self.recursive = '**' in path
+        self.max_depth = None
+        self.regex = None
+        if self.recursive:
+            self.base_path = path.split('**')[0]
+            self.regex = re.compile(fnmatch.translate(os.path.normcase(path)))
+        elif has_wildcards(path):
+            # Plain wildcards only match at the depth they are written at
+            directory = path
+            while has_wildcards(directory):
+                directory = os.path.dirname(directory)
+            self.base_path = directory
+            self.max_depth = path[len(directory):].strip('/' + os.sep).replace(os.sep, '/').count('/')
+            self.regex = re.compile(fnmatch.translate(os.path.normcase(path)))
+        else:
+            self.base_path = path
+
+    def matches_extension(self, name):
+        extension = name.rsplit('.', 1)[-1] if '.' in name else ''
+        if extension in self.extension_set:
+            return True
+        return name.endswith(self.extensions)
+
+    def files(self):
+        return [file_path for file_path, _ in self.walk()]
+
+    def walk(self):
+        # Yields (file path, os.DirEntry or None) for every matching file
+        path = self.path
+        if self.regex is None:
+            if os.path.isfile(path):
+                self._remember(os.path.dirname(path) or os.curdir)
+                if self.matches_extension(path):
+                    yield path, None
+            elif os.path.isdir(path):
+                for item in self._walk_tree(path, 0):
+                    yield item
+            else:
+                self._remember(os.path.dirname(path) or os.curdir)
+        else:
+            base_path = self.base_path or os.curdir
+            depth = self.max_depth if self.max_depth is not None else -1
+            if os.path.isdir(base_path):
+                for item in self._walk_tree(base_path, depth):
+                    yield item
+            else:
+                self._remember(base_path)
+
+    def _remember(self, directory):
+        try:
+            self.dir_mtimes[directory] = os.stat(directory).st_mtime
+        except OSError:
+            pass
+
+    def _ancestor_rules(self, root):
+        # Ignore files above the walk, up to the repository root, apply to
+        # it as well, e.g. the root .gitignore when walking src/**
+        if not self.use_ignore_files:
+            return []
+        repository = find_repository_root(root)
+        root = os.path.abspath(root)
+        if repository is None or repository == root:
+            return []
+        directories = []
+        directory = os.path.dirname(root)
+        while True:
+            directories.append(directory)
+            if directory == repository:
+                break
+            directory = os.path.dirname(directory)
+
+        rules = []
+        for directory in reversed(directories):
+            local_rules = IgnoreRules.load(directory)
+            if local_rules is not None:
+                self._remember(directory)
+                rules.append(local_rules)
+        return rules
+
+    def _walk_tree(self, root, depth):
+        # depth: 0 lists root only, negative recurses without limit
+        stack = [(root, depth, self._ancestor_rules(root))]
+        # Ignore rules match absolute paths; context paths may be relative
+        absolute_root = os.path.abspath(root)
+
+        def absolute(path):
+            return os.path.join(absolute_root, path[len(root):].lstrip('/' + os.sep))
+
+        while stack:
+            directory, remaining, rules = stack.pop()
+            self._remember(directory)
+            if self.use_ignore_files:
+                local_rules = IgnoreRules.load(directory)
+                if local_rules is not None:
+                    rules = rules + [local_rules]
+
+            try:
+                entries = list(scandir(directory)) if scandir else None
+            except OSError:
+                continue
+
+            if entries is None:
+                entries = [_Entry(directory, name) for name in os.listdir(directory)]
+
+            subdirectories = []
+            for entry in entries:
+                name = entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                file_path = os.path.join(directory, name)
+
+                if is_dir:
+                    if remaining == 0 or name in self.ignored_dirs:
+                        continue
+                    if rules and self._ignored(rules, absolute(file_path), True):
+                        continue
+                    subdirectories.append((file_path, remaining - 1, rules))
+                    continue
+
+                if not self.matches_extension(name):
+                    continue
+                if self.regex is not None and not self.regex.match(os.path.normcase(file_path)):
+                    continue
+                if rules and self._ignored(rules, absolute(file_path), False):
+                    continue
+                yield file_path, entry
+
+            # Visit subdirectories in name order so results are stable
+            stack.extend(sorted(subdirectories, reverse=True))
+
+    def _ignored(self, rule_sets, path, is_dir):
+        ignored = False
+        for rules in rule_sets:
+            result = rules.match(path, is_dir)
+            if result is not None:
+                ignored = result
+        return ignored
+
+
+class _Entry:
+    # Minimal os.DirEntry stand-in for Python versions without os.scandir
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def stat(self):
+        return os.stat(self.path)
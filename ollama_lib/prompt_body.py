@@ -0,0 +1,58 @@
+import json
+
+
+# Encoded pieces are coalesced into chunks of about this size on the wire
+BODY_CHUNK_BYTES = 64 * 1024
+
+
+class PromptText:
+    # A long string kept as the list of its parts (usually the cached
+    # context file contents), so it can be encoded without joining it first
+    def __init__(self, parts):
+        self.parts = [part for part in parts if part]
+
+    def __str__(self):
+        return ''.join(self.parts)
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+
+def iter_json(payload, sort_keys=False):
+    keys = sorted(payload) if sort_keys else list(payload)
+    yield b'{'
+    for i, key in enumerate(keys):
+        if i:
+            yield b', '
+        yield json.dumps(key).encode('utf-8') + b': '
+        value = payload[key]
+        if isinstance(value, PromptText):
+            yield b'"'
+            for part in value.parts:
+                # Encoding one part at a time only copies the part being sent
+                yield json.dumps(part, ensure_ascii=False)[1:-1].encode('utf-8')
+            yield b'"'
+        else:
+            yield json.dumps(value, ensure_ascii=False).encode('utf-8')
+    yield b'}'
+
+
+class JsonBody:
+    # Re-iterable request body; requests sends it with chunked transfer
+    # encoding, and a retry after a connection error starts over
+    def __init__(self, payload, chunk_bytes=BODY_CHUNK_BYTES):
+        self.payload = payload
+        self.chunk_bytes = chunk_bytes
+
+    def __iter__(self):
+        buffered = []
+        size = 0
+        for piece in iter_json(self.payload):
+            buffered.append(piece)
+            size += len(piece)
+            if size >= self.chunk_bytes:
+                yield b''.join(buffered)
+                buffered = []
+                size = 0
+        if buffered:
+            yield b''.join(buffered)
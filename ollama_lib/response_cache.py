@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .prompt_body import iter_json
+
+
+def request_key(payload):
+    # Everything sent to the server except the transport and residency flags
+    data = dict((key, value) for key, value in payload.items() if key not in ('stream', 'keep_alive'))
+    digest = hashlib.sha256()
+    for piece in iter_json(data, sort_keys=True):
+        digest.update(piece)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.directory = None
+        self.max_bytes = 32 * 1024 * 1024
+        self.ttl = 7 * 24 * 3600
+        # key -> size on disk, least recently used first
+        self._entries = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def configure(self, directory, max_bytes=None, ttl=None):
+        with self._lock:
+            if directory != self.directory:
+                self.directory = directory
+                self._entries = None
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if ttl is not None:
+                self.ttl = ttl
+
+    def get(self, key):
+        with self._lock:
+            self._load_index()
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                return None
+
+            if self.ttl and time.time() - entry.get('created', 0) > self.ttl:
+                self._remove(key)
+                return None
+
+            # The file mtime records the last use for LRU ordering across sessions
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            self._entries.move_to_end(key)
+            return entry.get('response')
+
+    def put(self, key, response, model=None):
+        data = json.dumps({'created': time.time(), 'model': model, 'response': response})
+        with self._lock:
+            self._load_index()
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            self._bytes -= self._entries.pop(key, 0)
+            size = os.path.getsize(path)
+            self._entries[key] = size
+            self._bytes += size
+
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._load_index()
+            for key in list(self._entries):
+                self._remove(key)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _load_index(self):
+        if self._entries is not None:
+            return
+
+        entries = []
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-len('.json')], stat.st_size))
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._bytes += size
@@ -0,0 +1,118 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+STATE_QUEUED = 'queued'
+STATE_RUNNING = 'running'
+
+
+class RequestScheduler:
+    # Runs jobs on a bounded pool of worker threads. A job is any object
+    # with run(), cancel() and a cancelled attribute; run() is called even
+    # if the job was cancelled once it left the queue, and must return
+    # early then. view_id and label are used when available to track and
+    # describe it.
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self._queue = []
+        self._jobs = {}
+        self._workers = 0
+        # Workers waiting for a job, including ones about to take their first
+        self._idle = 0
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+
+    def configure(self, max_workers):
+        with self._cond:
+            self.max_workers = max(1, int(max_workers))
+            self._spawn_workers()
+            # Surplus workers exit once they finish their current job
+            self._cond.notify_all()
+
+    def submit(self, job, priority=PRIORITY_INTERACTIVE):
+        with self._cond:
+            job.job_id = next(self._ids)
+            job.priority = priority
+            job.state = STATE_QUEUED
+            job.submitted_at = time.time()
+            self._jobs[job.job_id] = job
+            heapq.heappush(self._queue, (priority, job.job_id, job))
+            self._spawn_workers()
+            self._cond.notify()
+        return job.job_id
+
+    def jobs(self, view_id=None):
+        with self._cond:
+            jobs = sorted(self._jobs.values(), key=lambda job: job.job_id)
+        if view_id is not None:
+            jobs = [job for job in jobs if getattr(job, 'view_id', None) == view_id]
+        return jobs
+
+    def queued_ahead(self, job):
+        with self._cond:
+            return sum(1 for priority, job_id, _ in self._queue
+                       if (priority, job_id) < (job.priority, job.job_id))
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return False
+            if job.state == STATE_QUEUED:
+                self._queue = [entry for entry in self._queue if entry[1] != job_id]
+                heapq.heapify(self._queue)
+        job.cancel()
+        return True
+
+    def cancel_view(self, view_id):
+        return sum(1 for job in self.jobs(view_id) if self.cancel(job.job_id))
+
+    def cancel_all(self):
+        return sum(1 for job in self.jobs() if self.cancel(job.job_id))
+
+    def _spawn_workers(self):
+        # Busy workers cannot take queued jobs; only idle ones count
+        while self._workers < self.max_workers and self._idle < len(self._queue):
+            self._workers += 1
+            self._idle += 1
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue and self._workers <= self.max_workers:
+                    self._cond.wait()
+                if self._workers > self.max_workers or not self._queue:
+                    self._workers -= 1
+                    self._idle -= 1
+                    return
+                _, _, job = heapq.heappop(self._queue)
+                self._idle -= 1
+                job.state = STATE_RUNNING
+                job.started_at = time.time()
+
+            try:
+                # Also run when cancelled after leaving the queue, so the
+                # job still reports that it finished
+                job.run()
+            except Exception as e:
+                print("Ollama Error: {0}".format(str(e)))
+            finally:
+                with self._cond:
+                    self._jobs.pop(job.job_id, None)
+                    self._idle += 1
@@ -0,0 +1,249 @@
+import re
+import bisect
+import threading
+
+
+# Words, keeping model names such as "llama3.2:latest" in one piece
+WORD_RE = re.compile(r'\w+(?:[.:-]\w+)*', re.UNICODE)
+
+# Only the start of long prompts and responses is indexed
+MAX_INDEXED_CHARS = 300
+
+# Words shorter than this are only matched by prefix, never by similarity
+MIN_FUZZY_CHARS = 4
+
+
+def words(text):
+    return set(WORD_RE.findall(text[:MAX_INDEXED_CHARS].lower()))
+
+
+def trigrams(word):
+    word = ' ' + word + ' '
+    return set(word[i:i + 3] for i in range(len(word) - 2))
+
+
+class SearchIndex:
+    # Word index for search-as-you-type. Every query word matches indexed
+    # words it is a prefix of (through a sorted vocabulary), or words that
+    # share most of its trigrams, which tolerates typos. Documents have
+    # primary fields (prompt, title, model) and secondary ones (response).
+    # Matching documents are found with set operations, ranked in tiers
+    # (exact words, primary fields, any field) and by recency within a tier
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}
+        self._keys = {}
+        # Word -> documents, for primary and secondary fields
+        self._primary = {}
+        self._secondary = {}
+        self._vocabulary = []
+        # Trigram -> words, for fuzzy matching of the vocabulary
+        self._word_grams = {}
+        self._pinned = set()
+        self._next = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, key, primary, secondary=(), item=None, pinned=False):
+        # Pinned documents (templates) come first within their tier
+        with self._lock:
+            self._remove(key)
+            doc = self._next
+            self._next += 1
+            primary_words = set()
+            for text in primary:
+                if text:
+                    primary_words.update(words(text))
+            secondary_words = set()
+            for text in secondary:
+                if text:
+                    secondary_words.update(words(text))
+            secondary_words -= primary_words
+            self._docs[doc] = (key, item, primary_words, secondary_words)
+            self._keys[key] = doc
+            for word in primary_words:
+                self._post(self._primary, word, doc)
+            for word in secondary_words:
+                self._post(self._secondary, word, doc)
+            if pinned:
+                self._pinned.add(doc)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def search(self, query, limit=50):
+        # Returns the matching items, best first
+        terms = WORD_RE.findall(query.lower())
+        with self._lock:
+            if not terms:
+                docs = sorted(self._docs)[-limit:][::-1]
+                return [self._docs[doc][1] for doc in docs]
+
+            expanded = [self._expand(term) for term in terms]
+            results = []
+            found = set()
+            for tier in range(3):
+                # Tiers are nested, later ones are only computed while there is room
+                docs = None
+                for term, matched in zip(terms, expanded):
+                    if tier == 0:
+                        term_docs = self._primary.get(term, set())
+                    elif tier == 1:
+                        term_docs = self._union(self._primary, matched)
+                    else:
+                        term_docs = self._union(self._primary, matched) | self._union(self._secondary, matched)
+                    docs = term_docs if docs is None else docs & term_docs
+                    if not docs:
+                        break
+                if not docs:
+                    continue
+                pinned = sorted((doc for doc in self._pinned if doc in docs and doc not in found), reverse=True)
+                # Sorting beats a heap here: sets of ints iterate in almost ascending order
+                newest = sorted(docs)[-(limit + len(found) + len(pinned)):][::-1]
+                for doc in pinned + newest:
+                    if doc not in found:
+                        found.add(doc)
+                        results.append(doc)
+                        if len(results) >= limit:
+                            return [self._docs[doc][1] for doc in results]
+            return [self._docs[doc][1] for doc in results]
+
+    def _expand(self, term):
+        # Indexed words the term is a prefix of, or that look like a typo of it
+        start = bisect.bisect_left(self._vocabulary, term)
+        end = bisect.bisect_left(self._vocabulary, term + '\uffff', start)
+        matched = self._vocabulary[start:end]
+        if len(term) >= MIN_FUZZY_CHARS:
+            grams = trigrams(term)
+            counts = {}
+            for gram in grams:
+                for word in self._word_grams.get(gram, ()):
+                    counts[word] = counts.get(word, 0) + 1
+            required = max(2, (len(grams) * 3 + 4) // 5)
+            matched = matched + [word for word, count in counts.items()
+                                 if count >= required and abs(len(word) - len(term)) <= 2]
+        return matched
+
+    def _union(self, postings, matched):
+        # The result may be one of the postings sets, it must not be modified
+        sets = [postings[word] for word in matched if word in postings]
+        if not sets:
+            return set()
+        if len(sets) == 1:
+            return sets[0]
+        return set().union(*sets)
+
+    def _post(self, postings, word, doc):
+        docs = postings.get(word)
+        if docs is None:
+            if word not in self._primary and word not in self._secondary:
+                self._add_word(word)
+            docs = postings[word] = set()
+        docs.add(doc)
+
+    def _add_word(self, word):
+        bisect.insort(self._vocabulary, word)
+        if len(word) >= MIN_FUZZY_CHARS - 1:
+            for gram in trigrams(word):
+                self._word_grams.setdefault(gram, set()).add(word)
+
+    def _remove_word(self, word):
+        index = bisect.bisect_left(self._vocabulary, word)
+        if index < len(self._vocabulary) and self._vocabulary[index] == word:
+            del self._vocabulary[index]
+        for gram in trigrams(word):
+            words_with_gram = self._word_grams.get(gram)
+            if words_with_gram is not None:
+                words_with_gram.discard(word)
+                if not words_with_gram:
+                    del self._word_grams[gram]
+
+    def _remove(self, key):
+        doc = self._keys.pop(key, None)
+        if doc is None:
+            return
+        _, _, primary_words, secondary_words = self._docs.pop(doc)
+        self._pinned.discard(doc)
+        for postings, doc_words in ((self._primary, primary_words), (self._secondary, secondary_words)):
+            for word in doc_words:
+                docs = postings[word]
+                docs.discard(doc)
+                if not docs:
+                    del postings[word]
+                    if word not in self._primary and word not in self._secondary:
+                        self._remove_word(word)
+
+
+class PromptSearch:
+    # Search over the prompt history and the templates. The index is built on
+    # first use and then kept up to date by history events
+    def __init__(self, history):
+        self.history = history
+        self.index = None
+        self.templates = None
+        self._lock = threading.Lock()
+
+    def prepare(self):
+        with self._lock:
+            self._ensure_index()
+
+    def search(self, query, templates=(), limit=50):
+        with self._lock:
+            self._ensure_index()
+            if templates != self.templates:
+                self._sync_templates(templates)
+            index = self.index
+        return index.search(query, limit)
+
+    def _ensure_index(self):
+        if self.index is None:
+            self.index = SearchIndex()
+            self.templates = None
+            for entry in reversed(self.history.entries()):
+                self._add_history(entry)
+            self.history.add_listener(self._on_history)
+
+    def close(self):
+        self.history.remove_listener(self._on_history)
+        self.index = None
+
+    def _on_history(self, event, entry):
+        index = self.index
+        if index is None:
+            return
+        if event == 'clear':
+            index.clear()
+            self.templates = None
+        elif event == 'remove':
+            index.remove(('history', entry['id']))
+        else:
+            self._add_history(entry)
+
+    def _add_history(self, entry):
+        self.index.add(
+            ('history', entry['id']),
+            [entry['prompt'], entry.get('model')],
+            [entry.get('response')],
+            ('history', entry)
+        )
+
+    def _sync_templates(self, templates):
+        for i in range(len(self.templates or ())):
+            self.index.remove(('template', i))
+        for i, template in enumerate(templates):
+            self.index.add(
+                ('template', i),
+                [template.get('title'), template.get('prompt'), template.get('model')],
+                item=('template', template),
+                pinned=True
+            )
+        self.templates = list(templates)
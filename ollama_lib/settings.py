@@ -0,0 +1,27 @@
+class SettingsSnapshot:
+    # Read-only copy of the package settings, replaced as a whole when they
+    # change. Reading a plain dict avoids a call into the editor for every
+    # key; values are shared between readers, so copy them before changing
+    def __init__(self, values, fallback=None):
+        self._values = values
+        self._fallback = fallback
+
+    @classmethod
+    def of(cls, settings, overrides=None):
+        # overrides (the plugin's saved state) take precedence over settings.
+        # Settings.to_dict is only available in Sublime Text 4; otherwise
+        # other keys are read from the settings object
+        to_dict = getattr(settings, 'to_dict', None)
+        if to_dict is None:
+            return cls(dict(overrides or {}), settings)
+        values = to_dict()
+        values.update(overrides or {})
+        return cls(values)
+
+    def get(self, key, default=None):
+        if key in self._values or self._fallback is None:
+            return self._values.get(key, default)
+        return self._fallback.get(key, default)
+
+    def has(self, key):
+        return key in self._values or (self._fallback is not None and self._fallback.has(key))
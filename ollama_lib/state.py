@@ -0,0 +1,96 @@
+import os
+import json
+import threading
+
+
+# Changes within this many seconds of the first one are written together
+SAVE_DELAY = 0.5
+
+
+class StateStore:
+    # Values the plugin changes as it is used (selected model, context
+    # paths), kept in a JSON file of their own instead of the user's
+    # settings. Writes are delayed and coalesced into one atomic write
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.path = None
+        self.delay = SAVE_DELAY
+        self._values = None
+        self._timer = None
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    def configure(self, path, delay=None):
+        with self._lock:
+            if path != self.path:
+                self.flush()
+                self.path = path
+                self._values = None
+            if delay is not None:
+                self.delay = delay
+
+    def add_listener(self, listener):
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def values(self):
+        with self._lock:
+            self._load()
+            return dict(self._values)
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._load()
+            return self._values.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._load()
+            if key in self._values and self._values[key] == value:
+                return
+            self._values[key] = value
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(key, value)
+
+    def flush(self):
+        # Writes pending changes now; also run when the plugin unloads
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._values, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print("Ollama Error: Could not save state: {0}".format(str(e)))
+
+    def _load(self):
+        if self._values is not None:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._values = json.load(f)
+        except (OSError, ValueError, TypeError):
+            self._values = {}
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import threading
+
+
+SERVER_FIELDS = (
+    'prompt_eval_count', 'prompt_eval_duration', 'eval_count',
+    'eval_duration', 'load_duration', 'total_duration'
+)
+
+
+def nanoseconds_to_seconds(value):
+    return (value or 0) / 1e9
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    index = fraction * (len(values) - 1)
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+class RequestMetrics:
+    def __init__(self, model, endpoint, kind=None):
+        self.model = model
+        self.endpoint = endpoint
+        # Set for requests summarized apart from the model's other requests
+        self.kind = kind
+        self.started_at = time.time()
+        self.first_token_at = None
+        self.finished_at = None
+        self.server = {}
+
+    def token_received(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+
+    def finish(self, data):
+        self.finished_at = time.time()
+        for field in SERVER_FIELDS:
+            if field in data:
+                self.server[field] = data[field]
+
+    @property
+    def ttft(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def tokens_per_second(self):
+        duration = nanoseconds_to_seconds(self.server.get('eval_duration'))
+        if not duration:
+            return None
+        return self.server.get('eval_count', 0) / duration
+
+    @property
+    def prompt_tokens_per_second(self):
+        duration = nanoseconds_to_seconds(self.server.get('prompt_eval_duration'))
+        if not duration:
+            return None
+        return self.server.get('prompt_eval_count', 0) / duration
+
+    def to_dict(self):
+        data = {
+            'timestamp': self.started_at,
+            'model': self.model,
+            'endpoint': self.endpoint,
+            'ttft': self.ttft,
+            'elapsed': self.finished_at - self.started_at if self.finished_at else None,
+            'tokens_per_second': self.tokens_per_second,
+            'prompt_tokens_per_second': self.prompt_tokens_per_second
+        }
+        if self.kind:
+            data['kind'] = self.kind
+        data.update(self.server)
+        return data
+
+    def summary(self):
+        parts = []
+        eval_count = self.server.get('eval_count')
+        if eval_count is not None:
+            parts.append("{0} tokens in {1:.1f}s".format(
+                eval_count, nanoseconds_to_seconds(self.server.get('total_duration'))))
+        if self.tokens_per_second:
+            parts.append("{0:.1f} tok/s".format(self.tokens_per_second))
+        if self.ttft is not None:
+            parts.append("TTFT {0:.2f}s".format(self.ttft))
+        if 'prompt_eval_count' in self.server:
+            parts.append("prompt {0} tokens in {1:.2f}s".format(
+                self.server['prompt_eval_count'],
+                nanoseconds_to_seconds(self.server.get('prompt_eval_duration'))))
+        load = nanoseconds_to_seconds(self.server.get('load_duration'))
+        if load >= 0.5:
+            parts.append("load {0:.1f}s".format(load))
+        return " · ".join(parts)
+
+
+class MetricsLog:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.path = None
+        self.max_entries = 5000
+        self._count = None
+        self._lock = threading.Lock()
+
+    def configure(self, path, max_entries=None):
+        with self._lock:
+            if path != self.path:
+                self.path = path
+                self._count = None
+            if max_entries is not None:
+                self.max_entries = max_entries
+
+    def append(self, metrics):
+        line = json.dumps(metrics.to_dict()) + "\n"
+        with self._lock:
+            if self._count is None:
+                self._count = len(self._read())
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._count += 1
+
+            # Roll the log over once it is full, keeping the newest half
+            if self._count > self.max_entries:
+                entries = self._read()[-(self.max_entries // 2):]
+                self._write(entries)
+                self._count = len(entries)
+
+    def entries(self):
+        with self._lock:
+            return self._read()
+
+    def summarize(self):
+        by_model = {}
+        for entry in self.entries():
+            by_model.setdefault((entry.get('model'), entry.get('kind')), []).append(entry)
+
+        summary = []
+        for model, kind in sorted(by_model, key=lambda key: (key[0] or '', key[1] or '')):
+            entries = by_model[(model, kind)]
+
+            def values(field):
+                return [entry[field] for entry in entries if entry.get(field) is not None]
+
+            elapsed = values('elapsed')
+            ttft = values('ttft')
+            throughput = values('tokens_per_second')
+            prompt_throughput = values('prompt_tokens_per_second')
+            load = [nanoseconds_to_seconds(value) for value in values('load_duration')]
+            summary.append({
+                'model': model,
+                'kind': kind,
+                'requests': len(entries),
+                'ttft_p50': percentile(ttft, 0.5),
+                'ttft_p95': percentile(ttft, 0.95),
+                'elapsed_p50': percentile(elapsed, 0.5),
+                'elapsed_p95': percentile(elapsed, 0.95),
+                'tokens_per_second_p50': percentile(throughput, 0.5),
+                'prompt_tokens_per_second_p50': percentile(prompt_throughput, 0.5),
+                'load_p95': percentile(load, 0.95)
+            })
+        return summary
+
+    def _read(self):
+        entries = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return entries
+
+    def _write(self, entries):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+def format_summary(summary):
+    def seconds(value):
+        return "-" if value is None else "{0:.2f}s".format(value)
+
+    def rate(value):
+        return "-" if value is None else "{0:.1f}".format(value)
+
+    header = "{0:<32} {1:>6} {2:>9} {3:>9} {4:>9} {5:>9} {6:>9} {7:>12} {8:>9}".format(
+        "Model", "Reqs", "TTFT p50", "TTFT p95", "Time p50", "Time p95", "tok/s p50", "prompt tok/s", "Load p95")
+    lines = [header, "-" * len(header)]
+    for row in summary:
+        name = row['model'] or '?'
+        if row.get('kind'):
+            name = "{0} ({1})".format(name, row['kind'])
+        lines.append("{0:<32} {1:>6} {2:>9} {3:>9} {4:>9} {5:>9} {6:>9} {7:>12} {8:>9}".format(
+            name[:32],
+            row['requests'],
+            seconds(row['ttft_p50']),
+            seconds(row['ttft_p95']),
+            seconds(row['elapsed_p50']),
+            seconds(row['elapsed_p95']),
+            rate(row['tokens_per_second_p50']),
+            rate(row['prompt_tokens_per_second_p50']),
+            seconds(row['load_p95'])
+        ))
+    return "\n".join(lines)
@@ -0,0 +1,214 @@
+import os
+import json
+import math
+import mmap
+import array
+import operator
+import threading
+
+
+# Chunks sent per /api/embed request while indexing
+EMBED_BATCH_SIZE = 32
+
+FLOAT_BYTES = array.array('f').itemsize
+
+try:
+    # Python 3.12+, several times faster than the loop below
+    from math import sumprod as dot
+except ImportError:
+    def dot(a, b):
+        return sum(map(operator.mul, a, b))
+
+
+def normalize(vector):
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return array.array('f', [value / norm for value in vector])
+
+
+class VectorIndex:
+    # Embeddings of context chunks on disk: vectors.f32 is a matrix of
+    # normalized float32 rows, read through a memory map, and meta.json maps
+    # chunk digests to rows. Rows of chunks that are gone are reused, so a
+    # changed file only costs embedding its changed chunks
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.directory = None
+        self.dim = None
+        # digest -> row, and the rows that are free for reuse
+        self._rows = None
+        self._free = []
+        self._count = 0
+        self._file = None
+        self._map = None
+        self._vectors = None
+        self._lock = threading.Lock()
+        # Held while indexing, so concurrent requests embed each chunk once
+        self._update_lock = threading.Lock()
+
+    def configure(self, directory):
+        with self._lock:
+            if directory != self.directory:
+                self._close()
+                self.directory = directory
+                self._rows = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+            self._rows = None
+
+    def update(self, chunks, embed, batch_size=EMBED_BATCH_SIZE):
+        # Embeds the chunks that are not indexed yet and frees the rows of
+        # chunks no longer among them. embed takes a list of texts and
+        # returns their vectors
+        with self._update_lock:
+            with self._lock:
+                self._load()
+                wanted = set(chunk.digest for chunk in chunks)
+                missing = []
+                seen = set()
+                for chunk in chunks:
+                    if chunk.digest not in self._rows and chunk.digest not in seen:
+                        seen.add(chunk.digest)
+                        missing.append(chunk)
+                stale = [digest for digest in self._rows if digest not in wanted]
+                for digest in stale:
+                    self._free.append(self._rows.pop(digest))
+                if stale:
+                    # Saved before freed rows are overwritten
+                    self._save_meta()
+
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start:start + batch_size]
+                vectors = embed([chunk.text for chunk in batch])
+                with self._lock:
+                    for chunk, vector in zip(batch, vectors):
+                        self._put(chunk.digest, vector)
+
+            if missing:
+                with self._lock:
+                    self._save_meta()
+            return len(missing)
+
+    def scores(self, chunks, query):
+        # Cosine similarity of each chunk to the query vector; chunks that
+        # are not indexed score 0
+        query = normalize(query).tolist()
+        with self._lock:
+            self._load()
+            if self.dim is not None and len(query) != self.dim:
+                raise ValueError("Query has {0} dimensions, the index {1}".format(len(query), self.dim))
+            vectors = self._map_vectors()
+            dim = self.dim
+            rows = self._rows
+            scores = []
+            for chunk in chunks:
+                row = rows.get(chunk.digest)
+                if row is None or vectors is None:
+                    scores.append(0.0)
+                else:
+                    offset = row * dim
+                    scores.append(dot(vectors[offset:offset + dim], query))
+            return scores
+
+    def _put(self, digest, vector):
+        if self.dim is None:
+            self.dim = len(vector)
+        elif len(vector) != self.dim:
+            raise ValueError("Embedding has {0} dimensions, the index {1}".format(len(vector), self.dim))
+        row = self._free.pop() if self._free else self._count
+        data = normalize(vector).tobytes()
+
+        self._open()
+        self._release_map()
+        self._file.seek(row * self.dim * FLOAT_BYTES)
+        self._file.write(data)
+        self._file.flush()
+        if row == self._count:
+            self._count += 1
+        self._rows[digest] = row
+
+    def _load(self):
+        if self._rows is not None:
+            return
+        self._rows = {}
+        self._free = []
+        self._count = 0
+        self.dim = None
+        try:
+            with open(self._meta_path(), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+
+        # Vectors without a matching table are not trusted
+        if meta and meta.get('dim'):
+            size = 0
+            try:
+                size = os.path.getsize(self._vectors_path())
+            except OSError:
+                pass
+            self.dim = meta['dim']
+            self._count = size // (self.dim * FLOAT_BYTES)
+            rows = meta.get('rows', [])[:self._count]
+            for row, digest in enumerate(rows):
+                if digest:
+                    self._rows[digest] = row
+                else:
+                    self._free.append(row)
+            # Rows written after the table was last saved
+            self._free.extend(range(len(rows), self._count))
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._vectors_path()
+            self._file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+
+    def _map_vectors(self):
+        # The rows as floats, read straight from the page cache
+        if self._vectors is None and self._count and self.dim:
+            self._open()
+            self._map = mmap.mmap(self._file.fileno(), self._count * self.dim * FLOAT_BYTES,
+                                  access=mmap.ACCESS_READ)
+            self._vectors = memoryview(self._map).cast('f')
+        return self._vectors
+
+    def _release_map(self):
+        # Writes can grow the file; the map is made again on the next read
+        if self._vectors is not None:
+            self._vectors.release()
+            self._vectors = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _close(self):
+        self._release_map()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _save_meta(self):
+        rows = [None] * self._count
+        for digest, row in self._rows.items():
+            rows[row] = digest
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._meta_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'dim': self.dim, 'rows': rows}, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _vectors_path(self):
+        return os.path.join(self.directory, 'vectors.f32')
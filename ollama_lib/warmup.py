@@ -0,0 +1,77 @@
+import time
+import threading
+
+from .client import OllamaClient
+from .prompt_body import JsonBody
+
+
+class ModelWarmer:
+    # Loads models ahead of the first real request by sending an empty
+    # generate request, which makes Ollama load the model and return
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        # (url, model) -> time of the last successful preload
+        self._warmed = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def preload(self, url, model, keep_alive=None, min_interval=0):
+        payload = {"model": model, "stream": False}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return self._start((url, model), url, payload, min_interval)
+
+    def prefill(self, url, model, system, prompt, keep_alive=None):
+        # Evaluates the start of a prompt, generating a single token, so the
+        # server's prompt cache already holds it when a request beginning
+        # with the same text arrives. At most one runs per server and model
+        payload = {
+            "model": model,
+            "system": system,
+            "prompt": prompt,
+            "stream": False,
+            "options": {"num_predict": 1}
+        }
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return self._start((url, model, 'prefill'), url, payload)
+
+    def _start(self, key, url, payload, min_interval=0):
+        with self._lock:
+            if key in self._pending:
+                return False
+            if min_interval and time.time() - self._warmed.get(key, 0) < min_interval:
+                return False
+            self._pending.add(key)
+
+        thread = threading.Thread(target=self._run, args=(key, url, payload))
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def _run(self, key, url, payload):
+        model = payload["model"]
+        try:
+            response = OllamaClient.get_instance().post(
+                "{0}/api/generate".format(url),
+                data=JsonBody(payload),
+                headers={'Content-Type': 'application/json'}
+            )
+            response.raise_for_status()
+            load_duration = response.json().get('load_duration', 0) / 1e9
+            if load_duration >= 0.5:
+                print("Ollama: Loaded model {0} in {1:.1f}s".format(model, load_duration))
+            with self._lock:
+                self._warmed[key] = time.time()
+        except Exception as e:
+            print("Ollama Error: Could not preload {0}: {1}".format(model, str(e)))
+        finally:
+            with self._lock:
+                self._pending.discard(key)
@@ -0,0 +1,39 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_lib.pathmatch import PathMatcher
+
+
+class RepositoryIgnoreTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix='ollama-pathmatch-')
+        for directory in ('.git', os.path.join('src', 'gen'), os.path.join('src', 'lib')):
+            os.makedirs(os.path.join(self.root, directory))
+        with open(os.path.join(self.root, '.gitignore'), 'w') as f:
+            f.write("src/gen/\n")
+        for name in (os.path.join('src', 'gen', 'a.py'), os.path.join('src', 'lib', 'b.py')):
+            open(os.path.join(self.root, name), 'w').close()
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_anchored_root_rule_applies_to_relative_context_path(self):
+        for path in ('./src/**', 'src/**'):
+            files = PathMatcher(path, ['py']).files()
+            self.assertEqual([os.path.normpath(f) for f in files], [os.path.join('src', 'lib', 'b.py')], path)
+
+    def test_anchored_root_rule_applies_to_absolute_context_path(self):
+        files = PathMatcher(os.path.join(self.root, 'src', '**'), ['py']).files()
+        self.assertEqual(files, [os.path.join(self.root, 'src', 'lib', 'b.py')])
+
+
+if __name__ == '__main__':
+    unittest.main()